@@ -6,24 +6,14 @@ __email__ = "mariolpantunes@gmail.com"
 __status__ = "Development"
 
 
+from typing import Any, Dict, Optional, Tuple, Union
+
 import numpy as np
 
 
-def last(values: np.ndarray, tau: float) -> np.ndarray:
+def _last_reference(values: np.ndarray, tau: float) -> np.ndarray:
     """
-    Computes the exponential moving average using the 'last' interpolation scheme.
-
-    The recurrence relation is:
-    \\[
-    EMA(t_i) = EMA(t_{i-1}) e^{-(t_i - t_{i-1})/\tau} + y_{i-1} (1 - e^{-(t_i - t_{i-1})/\tau})
-    \\]
-
-    Args:
-        values (np.ndarray): array of time series values (x, y)
-        tau (float): half-life of EMA kernel
-
-    Returns:
-        np.ndarray: the result array (time, ema)
+    Loop implementation of `last`, kept as the reference path.
     """
     n = len(values)
     if n == 0:
@@ -49,21 +39,9 @@ def last(values: np.ndarray, tau: float) -> np.ndarray:
     return rv
 
 
-def next(values: np.ndarray, tau: float) -> np.ndarray:
+def _next_reference(values: np.ndarray, tau: float) -> np.ndarray:
     """
-    Computes the exponential moving average using the 'next' interpolation scheme.
-
-    The recurrence relation is:
-    \\[
-    EMA(t_i) = EMA(t_{i-1}) e^{-(t_i - t_{i-1})/\tau} + y_i (1 - e^{-(t_i - t_{i-1})/\tau})
-    \\]
-
-    Args:
-        values (np.ndarray): array of time series values (x, y)
-        tau (float): half-life of EMA kernel
-
-    Returns:
-        np.ndarray: the result array (time, ema)
+    Loop implementation of `next`, kept as the reference path.
     """
     n = len(values)
     if n == 0:
@@ -87,22 +65,9 @@ def next(values: np.ndarray, tau: float) -> np.ndarray:
     return rv
 
 
-def linear(values: np.ndarray, tau: float) -> np.ndarray:
+def _linear_reference(values: np.ndarray, tau: float) -> np.ndarray:
     """
-    Computes the exponential moving average using the 'linear' interpolation scheme.
-
-    The recurrence relation is:
-    \\[
-    EMA(t_i) = EMA(t_{i-1}) w + y_i (1 - w_2) + y_{i-1} (w_2 - w)
-    \\]
-    where \\( w = e^{-\\Delta t/\tau} \\) and \\( w_2 = (1 - w) / (\\Delta t/\tau) \\).
-
-    Args:
-        values (np.ndarray): array of time series values (x, y)
-        tau (float): half-life of EMA kernel
-
-    Returns:
-        np.ndarray: the result array (time, ema)
+    Loop implementation of `linear`, kept as the reference path.
     """
     n = len(values)
     if n == 0:
@@ -133,3 +98,463 @@ def linear(values: np.ndarray, tau: float) -> np.ndarray:
         rv[i] = [t[i], ema_curr]
 
     return rv
+
+
+_BLOCK = 64
+_CHUNK = 16384
+
+
+def _step(
+    dt: np.ndarray,
+    y_prev: np.ndarray,
+    y_curr: np.ndarray,
+    tau: Union[float, np.ndarray],
+    scheme: str,
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Computes the decay and input of an EMA step \\( EMA = w EMA_{prev} + b \\).
+
+    Args:
+        dt (np.ndarray): length of the steps
+        y_prev (np.ndarray): values at the start of the steps
+        y_curr (np.ndarray): values at the end of the steps
+        tau (Union[float, np.ndarray]): half-life of EMA kernel
+        scheme (str): interpolation scheme ('last', 'next' or 'linear')
+
+    Returns:
+        Tuple[np.ndarray, np.ndarray]: the decays and inputs (w, b)
+    """
+    tmp = dt / tau
+    w = np.exp(-tmp)
+
+    if scheme == "last":
+        b = y_prev * (1.0 - w)
+    elif scheme == "next":
+        b = y_curr * (1.0 - w)
+    elif scheme == "linear":
+        w2 = np.divide(1.0 - w, tmp, out=np.empty_like(w), where=tmp > 1e-6)
+        # Numerical stability for small dt/tau using Taylor expansion
+        small = tmp <= 1e-6
+        if np.any(small):
+            ts = tmp[small]
+            w2[small] = 1.0 - (ts / 2.0) + (ts**2 / 6.0) - (ts**3 / 24.0)
+        b = y_curr * (1.0 - w2) + y_prev * (w2 - w)
+    else:
+        raise ValueError(f"Unknown interpolation scheme: {scheme}")
+    return w, b
+
+
+def _coefficients(
+    t: np.ndarray, y: np.ndarray, tau: Union[float, np.ndarray], scheme: str
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Computes the coefficients of the EMA recurrence \\( EMA_i = a_i EMA_{i-1} + b_i \\).
+
+    The first coefficients are \\( a_0 = 0 \\) and \\( b_0 = y_0 \\), so that the
+    recurrence starts at the first observation.
+    When tau is an array, the coefficients have one column per tau.
+
+    Args:
+        t (np.ndarray): observation times
+        y (np.ndarray): observation values
+        tau (Union[float, np.ndarray]): half-life of EMA kernel
+        scheme (str): interpolation scheme ('last', 'next' or 'linear')
+
+    Returns:
+        Tuple[np.ndarray, np.ndarray]: the coefficients (a, b)
+    """
+    dt = np.diff(t)
+    if np.ndim(tau) > 0:
+        dt = dt[:, None]
+        y = y[:, None]
+    w, b = _step(dt, y[:-1], y[1:], tau, scheme)
+
+    y0 = np.broadcast_to(y[:1], (1,) + w.shape[1:])
+    a = np.concatenate((np.zeros_like(y0), w))
+    b = np.concatenate((y0, b))
+    return a, b
+
+
+def _doubling_scan(a: np.ndarray, b: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Hillis-Steele scan of the recurrence \\( x_j = a_j x_{j-1} + b_j \\) along axis 1.
+
+    Returns:
+        Tuple[np.ndarray, np.ndarray]: the cumulative decays and the scanned values
+    """
+    a = a.copy()
+    x = b.copy()
+    size = a.shape[1]
+    step = 1
+    while step < size:
+        x[:, step:] += a[:, step:] * x[:, :-step]
+        a[:, step:] = a[:, step:] * a[:, :-step]
+        step *= 2
+    return a, x
+
+
+def _linear_scan(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    """
+    Solves the first-order linear recurrence \\( x_i = a_i x_{i-1} + b_i \\) along axis 0.
+
+    The series is split into blocks that are scanned in parallel,
+    the carries between blocks are solved recursively with the same scan.
+    Only products of decays are formed, so there is no risk of overflow.
+
+    Args:
+        a (np.ndarray): the decay of each step (a_0 is ignored)
+        b (np.ndarray): the input of each step
+
+    Returns:
+        np.ndarray: the solution of the recurrence
+    """
+    n = a.shape[0]
+    if n <= _BLOCK:
+        return _doubling_scan(a[None], b[None])[1][0]
+
+    nb = -(-n // _BLOCK)
+    pad = nb * _BLOCK - n
+    tail = a.shape[1:]
+    if pad:
+        a = np.concatenate((a, np.ones((pad,) + tail)))
+        b = np.concatenate((b, np.zeros((pad,) + tail)))
+
+    da, x = _doubling_scan(
+        a.reshape((nb, _BLOCK) + tail), b.reshape((nb, _BLOCK) + tail)
+    )
+    carry = _linear_scan(da[:, -1], x[:, -1])
+    x[1:] += da[1:] * carry[:-1, None]
+    return x.reshape((nb * _BLOCK,) + tail)[:n]
+
+
+def _ema_scan(
+    t: np.ndarray,
+    y: np.ndarray,
+    tau: Union[float, np.ndarray],
+    scheme: str,
+    ema0: Optional[float] = None,
+    reset: Optional[np.ndarray] = None,
+) -> np.ndarray:
+    """
+    Computes the EMA at every observation time.
+
+    The series is processed in cache-sized chunks, the last EMA of each
+    chunk is the starting value of the next one.
+    The recurrence restarts (\\( EMA_i = y_i \\)) wherever reset is set.
+
+    Args:
+        t (np.ndarray): observation times
+        y (np.ndarray): observation values
+        tau (Union[float, np.ndarray]): half-life of EMA kernel
+        scheme (str): interpolation scheme ('last', 'next' or 'linear')
+        ema0 (Optional[float]): EMA at t_0 (defaults to y_0)
+        reset (Optional[np.ndarray]): boolean mask of the restart positions
+
+    Returns:
+        np.ndarray: the EMA values, with one column per tau when tau is an array
+    """
+    n = len(t)
+    rows = max(_BLOCK, _CHUNK // np.size(tau))
+    rv = np.empty((n,) + np.shape(tau))
+    rv[0] = y[0] if ema0 is None else ema0
+    for low in range(0, n - 1, rows):
+        high = min(low + rows, n - 1) + 1
+        a, b = _coefficients(t[low:high], y[low:high], tau, scheme)
+        b[0] = rv[low]
+        if reset is not None:
+            mask = reset[low + 1 : high]
+            a[1:][mask] = 0.0
+            b[1:][mask] = y[low + 1 : high][mask]
+        rv[low + 1 : high] = _linear_scan(a, b)[1:]
+    return rv
+
+
+def _ema(values: np.ndarray, tau: float, scheme: str) -> np.ndarray:
+    n = len(values)
+    if n == 0:
+        return np.array([])
+
+    t = values[:, 0]
+    return np.column_stack((t, _ema_scan(t, values[:, 1], tau, scheme)))
+
+
+def last(values: np.ndarray, tau: float) -> np.ndarray:
+    """
+    Computes the exponential moving average using the 'last' interpolation scheme.
+
+    The recurrence relation is:
+    \\[
+    EMA(t_i) = EMA(t_{i-1}) e^{-(t_i - t_{i-1})/\tau} + y_{i-1} (1 - e^{-(t_i - t_{i-1})/\tau})
+    \\]
+
+    The recurrence is solved with a vectorized scan, `_last_reference`
+    holds the equivalent loop.
+
+    Args:
+        values (np.ndarray): array of time series values (x, y)
+        tau (float): half-life of EMA kernel
+
+    Returns:
+        np.ndarray: the result array (time, ema)
+    """
+    return _ema(values, tau, "last")
+
+
+def next(values: np.ndarray, tau: float) -> np.ndarray:
+    """
+    Computes the exponential moving average using the 'next' interpolation scheme.
+
+    The recurrence relation is:
+    \\[
+    EMA(t_i) = EMA(t_{i-1}) e^{-(t_i - t_{i-1})/\tau} + y_i (1 - e^{-(t_i - t_{i-1})/\tau})
+    \\]
+
+    The recurrence is solved with a vectorized scan, `_next_reference`
+    holds the equivalent loop.
+
+    Args:
+        values (np.ndarray): array of time series values (x, y)
+        tau (float): half-life of EMA kernel
+
+    Returns:
+        np.ndarray: the result array (time, ema)
+    """
+    return _ema(values, tau, "next")
+
+
+def linear(values: np.ndarray, tau: float) -> np.ndarray:
+    """
+    Computes the exponential moving average using the 'linear' interpolation scheme.
+
+    The recurrence relation is:
+    \\[
+    EMA(t_i) = EMA(t_{i-1}) w + y_i (1 - w_2) + y_{i-1} (w_2 - w)
+    \\]
+    where \\( w = e^{-\\Delta t/\tau} \\) and \\( w_2 = (1 - w) / (\\Delta t/\tau) \\).
+
+    The recurrence is solved with a vectorized scan, `_linear_reference`
+    holds the equivalent loop.
+
+    Args:
+        values (np.ndarray): array of time series values (x, y)
+        tau (float): half-life of EMA kernel
+
+    Returns:
+        np.ndarray: the result array (time, ema)
+    """
+    return _ema(values, tau, "linear")
+
+
+def bank(values: np.ndarray, taus: np.ndarray, scheme: str = "linear") -> np.ndarray:
+    """
+    Computes the exponential moving averages for several half-lives in a single pass.
+
+    The time differences are computed once and all the half-lives are
+    updated together, column \\( k \\) matches the EMA with \\( \\tau_k \\).
+
+    Args:
+        values (np.ndarray): array of time series values (x, y)
+        taus (np.ndarray): half-lives of EMA kernels
+        scheme (str): interpolation scheme ('last', 'next' or 'linear')
+
+    Returns:
+        np.ndarray: the result matrix (n, len(taus)) with one EMA per column
+    """
+    n = len(values)
+    if n == 0:
+        return np.array([])
+
+    taus = np.asarray(taus, dtype=float).reshape(-1)
+    return _ema_scan(values[:, 0], values[:, 1], taus, scheme)
+
+
+def sample(
+    values: np.ndarray, out_times: np.ndarray, tau: float, scheme: str = "linear"
+) -> np.ndarray:
+    """
+    Computes the exponential moving average at arbitrary query times.
+
+    The EMA is computed at the observations and carried forward from the
+    last observation \\( t_j \\le q \\) to each query time \\( q \\),
+    using the same interpolation scheme between \\( t_j \\) and \\( t_{j+1} \\).
+    After the last observation its value is held, before the first
+    observation the EMA is not defined (NaN).
+
+    Args:
+        values (np.ndarray): array of time series values (x, y)
+        out_times (np.ndarray): query times
+        tau (float): half-life of EMA kernel
+        scheme (str): interpolation scheme ('last', 'next' or 'linear')
+
+    Returns:
+        np.ndarray: the result array (time, ema)
+    """
+    n = len(values)
+    out_times = np.asarray(out_times, dtype=float)
+    if n == 0 or len(out_times) == 0:
+        return np.array([])
+
+    t = values[:, 0]
+    y = values[:, 1]
+    rv = _ema_scan(t, y, tau, scheme)
+
+    j = np.searchsorted(t, out_times, side="right") - 1
+    valid = j >= 0
+    j = np.maximum(j, 0)
+    k = np.minimum(j + 1, n - 1)
+
+    dt = out_times - t[j]
+    if scheme == "linear":
+        span = t[k] - t[j]
+        frac = np.divide(dt, span, out=np.zeros_like(dt), where=span > 0)
+        y_curr = y[j] + (y[k] - y[j]) * frac
+    else:
+        y_curr = y[k]
+    w, b = _step(dt, y[j], y_curr, tau, scheme)
+
+    ema_q = np.where(valid, rv[j] * w + b, np.nan)
+    return np.column_stack((out_times, ema_q))
+
+
+def batch(
+    values: np.ndarray, offsets: np.ndarray, tau: float, scheme: str = "linear"
+) -> np.ndarray:
+    """
+    Computes the exponential moving average of many series in a single call.
+
+    The series are concatenated in a flat array and delimited by offsets
+    (CSR layout): series \\( k \\) is `values[offsets[k]:offsets[k + 1]]`.
+    The recurrence restarts at the beginning of every series.
+
+    Args:
+        values (np.ndarray): flat array of time series values (x, y)
+        offsets (np.ndarray): start of each series, followed by len(values)
+        tau (float): half-life of EMA kernel
+        scheme (str): interpolation scheme ('last', 'next' or 'linear')
+
+    Returns:
+        np.ndarray: the flat result array (time, ema)
+
+    Raises:
+        ValueError: If the offsets do not delimit the values.
+    """
+    n = len(values)
+    offsets = np.asarray(offsets, dtype=int)
+    if (
+        len(offsets) == 0
+        or offsets[0] != 0
+        or offsets[-1] != n
+        or np.any(np.diff(offsets) < 0)
+    ):
+        raise ValueError("offsets must be non-decreasing from 0 to len(values).")
+    if n == 0:
+        return np.array([])
+
+    t = values[:, 0]
+    reset = np.zeros(n, dtype=bool)
+    reset[offsets[offsets < n]] = True
+
+    # the steps between series are computed and then discarded
+    with np.errstate(over="ignore", invalid="ignore"):
+        rv = _ema_scan(t, values[:, 1], tau, scheme, reset=reset)
+    return np.column_stack((t, rv))
+
+
+class EMAState:
+    """
+    Incremental exponential moving average for live feeds.
+
+    The state keeps the last observation and the current EMA, so new
+    observations are processed in O(k) and produce the same values as the
+    batch functions (`last`, `next` and `linear`) on the concatenated series.
+
+    Args:
+        tau (float): half-life of EMA kernel
+        scheme (str): interpolation scheme ('last', 'next' or 'linear')
+    """
+
+    def __init__(self, tau: float, scheme: str = "linear"):
+        if scheme not in ("last", "next", "linear"):
+            raise ValueError(f"Unknown interpolation scheme: {scheme}")
+        self.tau = tau
+        self.scheme = scheme
+        self.time: Optional[float] = None
+        self.value: Optional[float] = None
+        self.ema: Optional[float] = None
+
+    def update(self, t: float, y: float) -> float:
+        """
+        Adds a single observation to the EMA.
+
+        Args:
+            t (float): time of the observation
+            y (float): value of the observation
+
+        Returns:
+            float: the EMA at time t
+        """
+        return float(self.update_batch(np.array([t]), np.array([y]))[0, 1])
+
+    def update_batch(self, times: np.ndarray, values: np.ndarray) -> np.ndarray:
+        """
+        Adds a batch of observations to the EMA.
+
+        Args:
+            times (np.ndarray): times of the observations
+            values (np.ndarray): values of the observations
+
+        Returns:
+            np.ndarray: the result array (time, ema)
+        """
+        times = np.asarray(times, dtype=float)
+        values = np.asarray(values, dtype=float)
+        if len(times) == 0:
+            return np.array([])
+
+        if self.ema is None:
+            rv = _ema_scan(times, values, self.tau, self.scheme)
+        else:
+            rv = _ema_scan(
+                np.concatenate(([self.time], times)),
+                np.concatenate(([self.value], values)),
+                self.tau,
+                self.scheme,
+                self.ema,
+            )[1:]
+
+        self.time = float(times[-1])
+        self.value = float(values[-1])
+        self.ema = float(rv[-1])
+        return np.column_stack((times, rv))
+
+    def to_dict(self) -> Dict[str, Any]:
+        """
+        Returns the state as a dictionary (suitable for JSON checkpoints).
+
+        Returns:
+            Dict[str, Any]: the state of the EMA
+        """
+        return {
+            "tau": self.tau,
+            "scheme": self.scheme,
+            "time": self.time,
+            "value": self.value,
+            "ema": self.ema,
+        }
+
+    @classmethod
+    def from_dict(cls, state: Dict[str, Any]) -> "EMAState":
+        """
+        Restores a state saved with `to_dict`.
+
+        Args:
+            state (Dict[str, Any]): the state of the EMA
+
+        Returns:
+            EMAState: the restored EMA
+        """
+        rv = cls(state["tau"], state["scheme"])
+        rv.time = state["time"]
+        rv.value = state["value"]
+        rv.ema = state["ema"]
+        return rv
@@ -6,6 +6,10 @@ __email__ = "mariolpantunes@gmail.com"
 __status__ = "Development"
 
 
+from collections import OrderedDict
+from math import comb, factorial
+from typing import Optional
+
 import numpy as np
 
 
@@ -43,6 +47,16 @@ def lagrange_derivative(
     return p0 + p1 + p2
 
 
+def _contract(weights: np.ndarray, y: np.ndarray, idx: np.ndarray) -> np.ndarray:
+    """
+    Applies the stencil weights (n, s) or (n, s, k) to the values y[idx],
+    where y is (n,) or (n, channels). The extra weight axis goes last.
+    """
+    if weights.ndim == 3:
+        return np.einsum("ijk,ij...->i...k", weights, y[idx])
+    return np.einsum("ij,ij...->i...", weights, y[idx])
+
+
 def cfd(x: np.ndarray, y: np.ndarray) -> np.ndarray:
     """
     Computes the central first order derivative for uneven space sequences.
@@ -52,12 +66,15 @@ def cfd(x: np.ndarray, y: np.ndarray) -> np.ndarray:
     The first and last elements are computed based on the forward and
     backward definition of the first derivative.
 
+    The Lagrange coefficients only depend on x, so several channels
+    sampled on the same x (y with shape (n, channels)) share them.
+
     Args:
         x (np.ndarray): the value of the points in the x axis coordinates
-        y (np.ndarray): the value of the points in the y axis coordinates
+        y (np.ndarray): the value of the points in the y axis coordinates, shape (n,) or (n, channels)
 
     Returns:
-        np.ndarray: the first order derivative
+        np.ndarray: the first order derivative (with the shape of y)
 
     Raises:
         ValueError: If the length of x or y is smaller than 3.
@@ -65,29 +82,22 @@ def cfd(x: np.ndarray, y: np.ndarray) -> np.ndarray:
     if len(x) < 3:
         raise ValueError("cfd requires at least 3 points.")
 
-    # Vectorized central derivative
-    # For i in [1, n-2]:
-    x0, x1, x2 = x[:-2], x[1:-1], x[2:]
-    y0, y1, y2 = y[:-2], y[1:-1], y[2:]
-
-    # Lagrange derivative at x1
-    d1_central = (
-        y0 * (x1 - x2) / ((x0 - x1) * (x0 - x2))
-        + y1 * (2 * x1 - x0 - x2) / ((x1 - x0) * (x1 - x2))
-        + y2 * (x1 - x0) / ((x2 - x0) * (x2 - x1))
+    x = np.asarray(x, dtype=float)
+    n = len(x)
+    # Triplet of each point: central, forward for the first, backward for the last
+    start = np.clip(np.arange(n) - 1, 0, n - 3)
+    idx = start[:, None] + np.arange(3)
+    x0, x1, x2 = x[idx[:, 0]], x[idx[:, 1]], x[idx[:, 2]]
+
+    # Lagrange derivative coefficients at x
+    weights = np.column_stack(
+        (
+            (2 * x - x1 - x2) / ((x0 - x1) * (x0 - x2)),
+            (2 * x - x0 - x2) / ((x1 - x0) * (x1 - x2)),
+            (2 * x - x0 - x1) / ((x2 - x0) * (x2 - x1)),
+        )
     )
-
-    # Forward derivative for the first point (at x[0])
-    x0, x1, x2 = x[0], x[1], x[2]
-    y0, y1, y2 = y[0], y[1], y[2]
-    d1_first = lagrange_derivative(x0, x0, x1, x2, y0, y1, y2)
-
-    # Backward derivative for the last point (at x[-1])
-    x0, x1, x2 = x[-3], x[-2], x[-1]
-    y0, y1, y2 = y[-3], y[-2], y[-1]
-    d1_last = lagrange_derivative(x2, x0, x1, x2, y0, y1, y2)
-
-    return np.concatenate(([d1_first], d1_central, [d1_last]))
+    return _contract(weights, np.asarray(y, dtype=float), idx)
 
 
 def csd(x: np.ndarray, y: np.ndarray) -> np.ndarray:
@@ -97,12 +107,15 @@ def csd(x: np.ndarray, y: np.ndarray) -> np.ndarray:
     The computation is based on the second order polynomial fitting.
     The second derivative is constant for each triplet of points.
 
+    The coefficients only depend on x, so several channels sampled on the
+    same x (y with shape (n, channels)) share them.
+
     Args:
         x (np.ndarray): the value of the points in the x axis coordinates
-        y (np.ndarray): the value of the points in the y axis coordinates
+        y (np.ndarray): the value of the points in the y axis coordinates, shape (n,) or (n, channels)
 
     Returns:
-        np.ndarray: the second order derivative
+        np.ndarray: the second order derivative (with the shape of y)
 
     Raises:
         ValueError: If the length of x or y is smaller than 3.
@@ -110,37 +123,30 @@ def csd(x: np.ndarray, y: np.ndarray) -> np.ndarray:
     if len(x) < 3:
         raise ValueError("csd requires at least 3 points.")
 
-    # Vectorized central second derivative
-    x1, x2, x3 = x[:-2], x[1:-1], x[2:]
-    y1, y2, y3 = y[:-2], y[1:-1], y[2:]
+    x = np.asarray(x, dtype=float)
+    n = len(x)
+    # First point (forward) and last point (backward) use the same parabola as their neighbors
+    start = np.clip(np.arange(n) - 1, 0, n - 3)
+    idx = start[:, None] + np.arange(3)
+    x1, x2, x3 = x[idx[:, 0]], x[idx[:, 1]], x[idx[:, 2]]
 
     # Second derivative formula for unevenly spaced points
     # Derived from Lagrange polynomial: 2 * [ y1/((x1-x2)(x1-x3)) + y2/((x2-x1)(x2-x3)) + y3/((x3-x1)(x3-x2)) ]
-    d2_central = 2.0 * (
-        y1 / ((x1 - x2) * (x1 - x3))
-        + y2 / ((x2 - x1) * (x2 - x3))
-        + y3 / ((x3 - x1) * (x3 - x2))
+    weights = 2.0 * np.column_stack(
+        (
+            1.0 / ((x1 - x2) * (x1 - x3)),
+            1.0 / ((x2 - x1) * (x2 - x3)),
+            1.0 / ((x3 - x1) * (x3 - x2)),
+        )
     )
+    return _contract(weights, np.asarray(y, dtype=float), idx)
 
-    # First point (forward) and last point (backward) use the same parabola as their neighbors
-    return np.concatenate(([d2_central[0]], d2_central, [d2_central[-1]]))
 
-
-def finite_difference_weights(x0: float, x: np.ndarray, m: int = 1) -> np.ndarray:
+def _finite_difference_weights_reference(
+    x0: float, x: np.ndarray, m: int = 1
+) -> np.ndarray:
     """
-    Computes the weights for the m-th derivative at x0 using points in x.
-    This implements Fornberg's algorithm for arbitrary grids.
-
-    The algorithm recursively computes the weights \\( w_{i,j,k} \\) for the
-    \\( k \\)-th derivative using the first \\( i \\) points.
-
-    Args:
-        x0 (float): the point where the derivative is to be estimated
-        x (np.ndarray): the coordinates of the points in the stencil
-        m (int): the order of the derivative (0 for interpolation, 1 for 1st derivative, etc.)
-
-    Returns:
-        np.ndarray: weights for each point in x
+    Loop implementation of `finite_difference_weights`, kept as the reference path.
     """
     n = len(x)
     w = np.zeros((n, m + 1))
@@ -165,8 +171,185 @@ def finite_difference_weights(x0: float, x: np.ndarray, m: int = 1) -> np.ndarra
     return w[:, m]
 
 
+def _fornberg(x0: np.ndarray, x: np.ndarray, m: int) -> np.ndarray:
+    """
+    Fornberg's recurrence for a batch of stencils.
+
+    The loops over the stencil points and derivative orders are kept, every
+    step is an array operation over all the stencils (and over the previous
+    points of the stencil), so the Python work does not depend on n.
+
+    Returns:
+        np.ndarray: weights with shape (n, stencil_size, m + 1), all orders 0..m
+    """
+    n, size = x.shape
+    dx = x - x0[:, None]
+    w = np.zeros((n, size, m + 1))
+    w[:, 0, 0] = 1.0
+    c1 = np.ones(n)
+    for i in range(1, size):
+        mn = min(i, m)
+        c3 = x[:, i, None] - x[:, :i]
+        c2 = np.prod(c3, axis=1)
+        # new point: uses the weights of the previous point before its update
+        prev = w[:, i - 1, :].copy()
+        for k in range(mn, 0, -1):
+            w[:, i, k] = c1 * (k * prev[:, k - 1] - dx[:, i - 1] * prev[:, k]) / c2
+        w[:, i, 0] = -c1 * dx[:, i - 1] * prev[:, 0] / c2
+        # previous points of the stencil
+        for k in range(mn, 0, -1):
+            w[:, :i, k] = (dx[:, i, None] * w[:, :i, k] - k * w[:, :i, k - 1]) / c3
+        w[:, :i, 0] = dx[:, i, None] * w[:, :i, 0] / c3
+        c1 = c2
+    return w
+
+
+def finite_difference_weights(x0: float, x: np.ndarray, m: int = 1) -> np.ndarray:
+    """
+    Computes the weights for the m-th derivative at x0 using points in x.
+    This implements Fornberg's algorithm for arbitrary grids.
+
+    The algorithm recursively computes the weights \\( w_{i,j,k} \\) for the
+    \\( k \\)-th derivative using the first \\( i \\) points.
+
+    Args:
+        x0 (float): the point where the derivative is to be estimated
+        x (np.ndarray): the coordinates of the points in the stencil
+        m (int): the order of the derivative (0 for interpolation, 1 for 1st derivative, etc.)
+
+    Returns:
+        np.ndarray: weights for each point in x
+    """
+    x = np.asarray(x, dtype=float)
+    return _fornberg(np.array([x0], dtype=float), x[None, :], m)[0, :, m]
+
+
+def finite_difference_weights_batch(
+    x0: np.ndarray, x: np.ndarray, m: int = 1
+) -> np.ndarray:
+    """
+    Computes the weights for the m-th derivative of a batch of stencils.
+
+    Row i holds the Fornberg weights for the derivative at x0[i] using the
+    points x[i], all the stencils are computed together.
+
+    Args:
+        x0 (np.ndarray): the points where the derivatives are to be estimated, shape (n,)
+        x (np.ndarray): the coordinates of the points of each stencil, shape (n, stencil_size)
+        m (int): the order of the derivative (0 for interpolation, 1 for 1st derivative, etc.)
+
+    Returns:
+        np.ndarray: weights with shape (n, stencil_size)
+
+    Raises:
+        ValueError: If the shapes of x0 and x do not match.
+    """
+    x0 = np.asarray(x0, dtype=float)
+    x = np.asarray(x, dtype=float)
+    if x.ndim != 2 or x0.shape != (x.shape[0],):
+        raise ValueError("x0 must have shape (n,) and x shape (n, stencil_size).")
+    return _fornberg(x0, x, m)[:, :, m]
+
+
+class StencilCache:
+    """
+    Bounded LRU cache of Fornberg weights keyed on the stencil geometry.
+
+    The offsets of each stencil are normalized by its span h,
+    \\( u_j = (x_j - x_0) / h \\), and quantized to `tol`. Stencils with the
+    same key share the normalized weights, which are rescaled by \\( h^{-k} \\) for
+    the order k. Near-regular grids only compute a few distinct stencils.
+
+    Args:
+        maxsize (int): maximum number of stencils kept (least recently used are evicted)
+        tol (float): quantization step of the normalized offsets
+
+    Raises:
+        ValueError: If maxsize is not positive or tol is not positive.
+    """
+
+    def __init__(self, maxsize: int = 1024, tol: float = 1e-9):
+        if maxsize < 1:
+            raise ValueError("maxsize must be positive.")
+        if tol <= 0:
+            raise ValueError("tol must be positive.")
+        self.maxsize = maxsize
+        self.tol = tol
+        self.hits = 0
+        self.misses = 0
+        self._weights: OrderedDict = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._weights)
+
+    def clear(self):
+        """
+        Removes all the stencils and resets the counters.
+        """
+        self._weights.clear()
+        self.hits = 0
+        self.misses = 0
+
+    def weights(self, x0: np.ndarray, x: np.ndarray, m: int) -> np.ndarray:
+        """
+        Computes the weights of all the orders 0..m for a batch of stencils.
+
+        Every stencil is counted as a hit when its weights are reused
+        (from the cache or from another stencil of the batch), and as a miss
+        when the recurrence is computed.
+
+        Args:
+            x0 (np.ndarray): the points where the derivatives are to be estimated, shape (n,)
+            x (np.ndarray): the coordinates of the points of each stencil, shape (n, stencil_size)
+            m (int): the maximum order of the derivative
+
+        Returns:
+            np.ndarray: weights with shape (n, stencil_size, m + 1)
+        """
+        h = x[:, -1] - x[:, 0]
+        u = (x - x0[:, None]) / h[:, None]
+        keys = np.round(u / self.tol).astype(np.int64)
+        # group the identical keys (stable lexicographic sort of the rows)
+        order = np.lexsort(keys.T[::-1])
+        ordered = keys[order]
+        starts = np.concatenate(([True], np.any(ordered[1:] != ordered[:-1], axis=1)))
+        first = order[starts]
+        unique = keys[first]
+        inverse = np.empty(len(keys), dtype=int)
+        inverse[order] = np.cumsum(starts) - 1
+
+        table = np.empty((len(unique), x.shape[1], m + 1))
+        missing = []
+        for k, key in enumerate(map(tuple, unique.tolist())):
+            cached = self._weights.get((m, key))
+            if cached is None:
+                missing.append(k)
+            else:
+                self._weights.move_to_end((m, key))
+                table[k] = cached
+        self.misses += len(missing)
+        self.hits += len(x) - len(missing)
+
+        if missing:
+            missing = np.array(missing)
+            rows = first[missing]
+            table[missing] = _fornberg(np.zeros(len(rows)), u[rows], m)
+            for k in missing.tolist():
+                self._weights[(m, tuple(unique[k].tolist()))] = table[k]
+            while len(self._weights) > self.maxsize:
+                self._weights.popitem(last=False)
+
+        scale = h[:, None] ** -np.arange(m + 1.0)
+        return table[inverse] * scale[:, None, :]
+
+
 def fd_derivative(
-    x: np.ndarray, y: np.ndarray, m: int = 1, stencil_size: int = 3
+    x: np.ndarray,
+    y: np.ndarray,
+    m: int = 1,
+    stencil_size: int = 3,
+    all_orders: bool = False,
+    cache: Optional[StencilCache] = None,
 ) -> np.ndarray:
     """
     Computes the m-th order derivative using a moving stencil of specified size.
@@ -178,29 +361,252 @@ def fd_derivative(
 
     Args:
         x (np.ndarray): x coordinates
-        y (np.ndarray): y values
+        y (np.ndarray): y values, shape (n,) or (n, channels) sharing the weights
         m (int): derivative order
         stencil_size (int): number of points in the local stencil
+        all_orders (bool): return the derivatives of every order 0..m (from the same weights)
+        cache (Optional[StencilCache]): reuse the weights of repeated stencil geometries
 
     Returns:
-        np.ndarray: the m-th derivative
+        np.ndarray: the m-th derivative (with the shape of y), or the orders 0..m in a last axis of size m + 1
+
+    Raises:
+        ValueError: If there are fewer points than the stencil size.
     """
     n = len(x)
     if n < stencil_size:
         raise ValueError(f"Need at least {stencil_size} points for stencil.")
 
+    x = np.asarray(x, dtype=float)
+    # stencils are centered on each point, shifted inwards at the edges
     half = stencil_size // 2
-    deriv = np.zeros(n)
+    start = np.clip(np.arange(n) - half, 0, n - stencil_size)
+    idx = start[:, None] + np.arange(stencil_size)
+
+    # Fornberg's recurrence builds the weights of all the orders up to m
+    if cache is None:
+        weights = _fornberg(x, x[idx], m)
+    else:
+        weights = cache.weights(x, x[idx], m)
+    y = np.asarray(y, dtype=float)
+    if all_orders:
+        return _contract(weights, y, idx)
+    return _contract(weights[:, :, m], y, idx)
+
 
-    for i in range(n):
-        # Select stencil indices
-        start = max(0, min(i - half, n - stencil_size))
-        end = start + stencil_size
+def _span_groups(x: np.ndarray, left: np.ndarray, right: np.ndarray) -> np.ndarray:
+    """
+    Splits the points in groups whose neighbourhoods [left, right) have a
+    similar span and lie within about one span of each other.
+
+    A new group starts when the span of the neighbourhood changes by a factor
+    of two or when the points have moved by one span since the group started,
+    so a group never reaches over a gap that is large compared to the
+    neighbourhoods of its points.
+
+    Returns:
+        np.ndarray: group label of each point (consecutive points share labels)
+    """
+    span = x[right - 1] - x[left]
+    positive = span > 0
+    safe = np.where(positive, span, 1.0)
+    level = np.where(positive, np.floor(np.log2(safe)), -np.inf)
+    steps = np.where(positive[1:], np.diff(x) / safe[1:], 0.0)
+    travel = np.floor(np.concatenate(([0.0], np.cumsum(steps))))
+    change = (level[1:] != level[:-1]) | (travel[1:] != travel[:-1])
+    return np.concatenate(([0], np.cumsum(change)))
+
+
+def _local_moments(
+    x: np.ndarray,
+    y: np.ndarray,
+    left: np.ndarray,
+    right: np.ndarray,
+    group: np.ndarray,
+    degree: int,
+):
+    """
+    Computes the local moments of each neighbourhood [left, right) around x_i.
+
+    The points are split in groups (consecutive and local in x), each group
+    gets its own anchor and scale, and the prefix sums of the powers of the
+    anchored coordinates are computed over the rows its neighbourhoods touch.
+    The sums are moved to x_i with the binomial expansion, which stays
+    accurate because the anchor is close to every window of the group.
+
+    Returns:
+        Tuple: moments \\( \\sum (u_j)^k \\) (n, 2 degree + 1), \\( \\sum y_j (u_j)^k \\)
+        (n, degree + 1, channels) and the scale of u for each point, with
+        \\( u_j = (x_j - x_i) / s \\)
+    """
+    n = len(x)
+    starts = np.flatnonzero(np.concatenate(([True], group[1:] != group[:-1])))
+    ends = np.concatenate((starts[1:], [n]))
+    low, high = left[starts], right[ends - 1]
+    lengths = high - low
+    offsets = np.concatenate(([0], np.cumsum(lengths)))
+
+    anchor = (x[low] + x[high - 1]) / 2.0
+    scale = (x[high - 1] - x[low]) / 2.0
+    scale[scale <= 0] = 1.0
+
+    # rows of every group range, concatenated
+    owner = np.repeat(np.arange(len(starts)), lengths)
+    rows = np.arange(offsets[-1]) - offsets[owner] + low[owner]
+    z = (x[rows] - anchor[owner]) / scale[owner]
+    powers = z[:, None] ** np.arange(2 * degree + 1)
+    zero = np.zeros((1, 2 * degree + 1))
+    prefix_z = np.concatenate((zero, np.cumsum(powers, axis=0)))
+    weighted = powers[:, : degree + 1, None] * y[rows][:, None, :]
+    zero = np.zeros((1,) + weighted.shape[1:])
+    prefix_y = np.concatenate((zero, np.cumsum(weighted, axis=0)))
+
+    point_group = np.repeat(np.arange(len(starts)), ends - starts)
+    base = offsets[point_group] - low[point_group]
+    sum_z = prefix_z[base + right] - prefix_z[base + left]
+    sum_y = prefix_y[base + right] - prefix_y[base + left]
+
+    # binomial shift of the moments from the anchor to x_i
+    d = (x - anchor[point_group]) / scale[point_group]
+    moments = np.zeros_like(sum_z)
+    moments_y = np.zeros_like(sum_y)
+    for k in range(2 * degree + 1):
+        for j in range(k + 1):
+            c = comb(k, j) * (-d) ** (k - j)
+            moments[:, k] += c * sum_z[:, j]
+            if k <= degree:
+                moments_y[:, k] += c[:, None] * sum_y[:, j]
+    return moments, moments_y, scale[point_group]
+
+
+def _direct_fit(
+    x: np.ndarray,
+    y: np.ndarray,
+    left: np.ndarray,
+    right: np.ndarray,
+    rows: np.ndarray,
+    degree: int,
+) -> np.ndarray:
+    """
+    Fits the local polynomials of the given rows from the points of their
+    neighbourhoods, with the pseudo-inverse of the column-scaled Vandermonde
+    matrices (as np.polyfit does), which avoids squaring the condition number.
+
+    Returns:
+        np.ndarray: coefficients (rows, degree + 1, channels) of the powers of
+        \\( x_j - x_i \\)
+    """
+    lengths = right[rows] - left[rows]
+    index = left[rows, None] + np.arange(lengths.max())
+    inside = index < right[rows, None]
+    index = np.where(inside, index, left[rows, None])
+    d = np.where(inside, x[index] - x[rows, None], 0.0)
+    vander = d[:, :, None] ** np.arange(degree + 1) * inside[:, :, None]
+    norms = np.sqrt(np.sum(vander**2, axis=1, keepdims=True))
+    norms[norms == 0] = 1.0
+    targets = y[index] * inside[:, :, None]
+    pinv = np.linalg.pinv(vander / norms, rcond=lengths.max() * np.finfo(float).eps)
+    return (pinv @ targets) / np.moveaxis(norms, 1, 2)
+
+
+def savgol_derivative(
+    x: np.ndarray,
+    y: np.ndarray,
+    m: int = 1,
+    degree: int = 2,
+    width: Optional[float] = None,
+    window_size: Optional[int] = None,
+) -> np.ndarray:
+    """
+    Computes the value and the derivatives up to order m from local
+    least-squares polynomials (Savitzky-Golay style) on uneven x.
+
+    Around each \\( x_i \\) a polynomial of the given degree is fitted to
+    the neighbourhood (all the points with \\( |x_j - x_i| \\le width \\), or the
+    window_size points centered on i), and its derivatives at \\( x_i \\) are
+
+    \\[
+    f^{(k)}(x_i) \\approx k! \\, a_k, \\quad
+    \\min_a \\sum_{j} \\left(y_j - \\sum_{k=0}^{p} a_k (x_j - x_i)^k\\right)^2
+    \\]
+
+    The normal equations only need the local moments of the neighbourhood,
+    which are computed from prefix sums and solved in a single batch,
+    so the smoothing and the derivatives come from one pass. Neighbourhoods
+    whose normal equations are numerically singular are fitted from their
+    points instead.
 
-        stencil_x = x[start:end]
-        stencil_y = y[start:end]
+    Args:
+        x (np.ndarray): x coordinates (sorted)
+        y (np.ndarray): y values, shape (n,) or (n, channels) sharing the moments
+        m (int): maximum derivative order
+        degree (int): degree of the local polynomial (at least m)
+        width (Optional[float]): half width of the time-based neighbourhoods
+        window_size (Optional[int]): number of points of the count-based neighbourhoods
 
-        weights = finite_difference_weights(x[i], stencil_x, m)
-        deriv[i] = np.dot(weights, stencil_y)
+    Returns:
+        np.ndarray: array (n, m + 1) with the orders 0..m, (n, channels, m + 1) for 2-D y.
+        Neighbourhoods with fewer than degree + 1 distinct points are NaN.
 
-    return deriv
+    Raises:
+        ValueError: If m or degree are invalid, or not exactly one of width and window_size is given.
+    """
+    if m < 0 or degree < m:
+        raise ValueError("m must be in the range [0, degree].")
+    if (width is None) == (window_size is None):
+        raise ValueError("Exactly one of width and window_size must be given.")
+    if width is not None and width <= 0:
+        raise ValueError("width must be positive.")
+    if window_size is not None and window_size < degree + 1:
+        raise ValueError(f"window_size must be at least {degree + 1}.")
+
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    n = len(x)
+    if n == 0:
+        return np.empty((0,) + y.shape[1:] + (m + 1,))
+    channels = y.reshape(n, -1)
+
+    if width is not None:
+        left = np.searchsorted(x, x - width, side="left")
+        right = np.searchsorted(x, x + width, side="right")
+    else:
+        size = min(window_size, n)
+        left = np.clip(np.arange(n) - size // 2, 0, n - size)
+        right = left + size
+    group = _span_groups(x, left, right)
+
+    moments, moments_y, scale = _local_moments(x, channels, left, right, group, degree)
+
+    # the fit needs degree + 1 distinct points
+    steps = np.concatenate(([0], np.cumsum(np.diff(x) > 0)))
+    valid = steps[right - 1] - steps[left] + 1 > degree
+
+    hankel = np.arange(degree + 1)[:, None] + np.arange(degree + 1)
+    gram = moments[:, hankel]
+    # normal equations with a unit diagonal, their condition number (1-norm)
+    # comes with the inverse
+    diagonal = np.sqrt(np.maximum(np.diagonal(gram, axis1=1, axis2=2), 0.0))
+    diagonal[~(diagonal > 0)] = 1.0
+    gram /= diagonal[:, :, None] * diagonal[:, None, :]
+    gram[~valid] = np.eye(degree + 1)
+    singular = np.linalg.det(gram) == 0
+    gram[singular] = np.eye(degree + 1)
+    inverse = np.linalg.inv(gram)
+    norm = np.abs(gram).sum(axis=1).max(axis=1)
+    norm_inverse = np.abs(inverse).sum(axis=1).max(axis=1)
+    coefficients = inverse @ (moments_y / diagonal[:, :, None])
+    coefficients /= diagonal[:, :, None]
+    coefficients[~valid] = np.nan
+    # numerically singular normal equations (e.g. a burst of close points and
+    # one point across a gap) are fitted from the points themselves
+    direct = valid & (singular | ~(norm * norm_inverse < 1e10))
+    if np.any(direct):
+        rows = np.flatnonzero(direct)
+        coefficients[rows] = _direct_fit(x, channels, left, right, rows, degree)
+        coefficients[rows] *= scale[rows, None, None] ** np.arange(degree + 1)[:, None]
+
+    orders = np.arange(m + 1)
+    factor = np.array([factorial(k) for k in orders]) / scale[:, None] ** orders
+    rv = coefficients[:, : m + 1, :] * factor[:, :, None]
+    return np.moveaxis(rv, 1, -1).reshape(y.shape + (m + 1,))
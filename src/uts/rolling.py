@@ -6,25 +6,815 @@ __email__ = "mariolpantunes@gmail.com"
 __status__ = "Development"
 
 
-from typing import Callable, Optional
+import operator
+from bisect import bisect_left, bisect_right, insort
+from collections import deque
+from functools import cached_property
+from itertools import accumulate
+from typing import Callable, List, Optional, Sequence, Tuple, Union
 
 import numpy as np
 
 
-def _get_window_indices(times: np.ndarray, width_before: float, width_after: float):
+def _get_window_indices(
+    times: np.ndarray,
+    width_before: float,
+    width_after: float,
+    at_times: Optional[np.ndarray] = None,
+    min_obs: Optional[int] = None,
+    max_obs: Optional[int] = None,
+):
     """
     Computes the start and end indices for each rolling window.
-    Window is (t_i - width_before, t_i + width_after]
+    Window is (t_i - width_before, t_i + width_after], where t_i are the
+    observation times or the query times (at_times).
+
+    The time windows can be extended back to hold at least min_obs
+    observations and cut to hold at most the last max_obs observations.
     """
+    centers = times if at_times is None else at_times
     # side='right' for left boundary: first index j such that times[j] > t_i - width_before
-    left = np.searchsorted(times, times - width_before, side="right")
+    left = np.searchsorted(times, centers - width_before, side="right")
     # side='right' for right boundary: first index j such that times[j] > t_i + width_after
     # So the interval [left, right) contains indices j where t_i - width_before < times[j] <= t_i + width_after
-    right = np.searchsorted(times, times + width_after, side="right")
+    right = np.searchsorted(times, centers + width_after, side="right")
+    if min_obs is not None:
+        left = np.minimum(left, np.maximum(right - min_obs, 0))
+    if max_obs is not None:
+        left = np.maximum(left, right - max_obs)
     return left, right
 
 
-def num_obs(values: np.ndarray, width_before: float, width_after: float) -> np.ndarray:
+def _window_sum(x: np.ndarray, left: np.ndarray, right: np.ndarray) -> np.ndarray:
+    """
+    Sums x over each window [left, right) with a prefix sum.
+    """
+    cumsum = np.concatenate(([0], np.cumsum(x)))
+    return cumsum[right] - cumsum[left]
+
+
+def _window_sum_stable(
+    x: np.ndarray, left: np.ndarray, right: np.ndarray
+) -> np.ndarray:
+    """
+    Sums x over each window [left, right) with a compensated prefix sum.
+
+    The rounding error of every step of the prefix sum is recovered exactly
+    with the TwoSum transformation and accumulated in a second prefix sum.
+    """
+    cumsum = np.concatenate(([0.0], np.cumsum(x, dtype=float)))
+    a, b = cumsum[:-1], x
+    z = cumsum[1:] - a
+    error = (a - (cumsum[1:] - z)) + (b - z)
+    compensation = np.concatenate(([0.0], np.cumsum(error)))
+    return (cumsum[right] - cumsum[left]) + (compensation[right] - compensation[left])
+
+
+def _group_ranges(
+    left: np.ndarray, right: np.ndarray, group: np.ndarray
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Concatenates the rows touched by the windows of each group of
+    consecutive windows (the group ids are non-decreasing).
+
+    Returns:
+        Tuple: the rows of the concatenation, the group that owns each of them
+        and, for each window, the offset that maps its [left, right) into it
+    """
+    if len(group) == 0:
+        empty = np.array([], dtype=int)
+        return empty, empty, empty
+    starts = np.flatnonzero(np.concatenate(([True], group[1:] != group[:-1])))
+    ends = np.concatenate((starts[1:], [len(group)]))
+    low, high = left[starts], right[ends - 1]
+    lengths = high - low
+    offsets = np.concatenate(([0], np.cumsum(lengths)))
+    owner = np.repeat(np.arange(len(starts)), lengths)
+    rows = np.arange(offsets[-1]) - offsets[owner] + low[owner]
+    window_group = np.repeat(np.arange(len(starts)), ends - starts)
+    return rows, owner, offsets[window_group] - low[window_group]
+
+
+def _rolling_extreme(
+    y: np.ndarray, left: np.ndarray, right: np.ndarray, greater: bool
+) -> np.ndarray:
+    """
+    Computes the index of the extreme value of each window.
+
+    The windows are swept with a monotonic deque (amortized O(n)), the gaps
+    between disjoint windows are skipped, ties return the first index. Empty
+    windows and windows with a NaN (found with a prefix count, NaNs never
+    enter the deque) return -1.
+    """
+    before = operator.lt if greater else operator.gt
+    nan = np.isnan(y)
+    values = y.tolist()
+    missing = nan.tolist()
+    rv = []
+    candidates: deque = deque()
+    r = 0
+    for low, high in zip(left.tolist(), right.tolist()):
+        if low >= r:
+            # the window starts after everything seen (sparse at_times): jump
+            candidates.clear()
+            r = low
+        while r < high:
+            if not missing[r]:
+                v = values[r]
+                while candidates and before(values[candidates[-1]], v):
+                    candidates.pop()
+                candidates.append(r)
+            r += 1
+        while candidates and candidates[0] < low:
+            candidates.popleft()
+        rv.append(candidates[0] if candidates else -1)
+    rv = np.array(rv, dtype=int)
+    if np.any(nan):
+        rv[_window_sum(nan, left, right) > 0] = -1
+    return rv
+
+
+class _SortedBlocks:
+    """
+    Sorted multiset of floats stored as a list of sorted blocks.
+
+    Insertions and removals only touch one block (found by bisection),
+    blocks are split when they grow past twice the load factor.
+    """
+
+    def __init__(self, load: int = 512):
+        self._load = load
+        self._blocks: List[List[float]] = []
+        self._maxes: List[float] = []
+        self._size = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    def add(self, value: float):
+        self._size += 1
+        if not self._blocks:
+            self._blocks.append([value])
+            self._maxes.append(value)
+            return
+
+        k = bisect_left(self._maxes, value)
+        if k == len(self._blocks):
+            k -= 1
+        block = self._blocks[k]
+        insort(block, value)
+        self._maxes[k] = block[-1]
+        if len(block) > 2 * self._load:
+            self._blocks.insert(k + 1, block[self._load :])
+            del block[self._load :]
+            self._maxes.insert(k, block[-1])
+
+    def remove(self, value: float):
+        self._size -= 1
+        k = bisect_left(self._maxes, value)
+        block = self._blocks[k]
+        del block[bisect_left(block, value)]
+        if block:
+            self._maxes[k] = block[-1]
+        else:
+            del self._blocks[k]
+            del self._maxes[k]
+
+    def select(self, positions: Sequence[int]) -> List[float]:
+        """
+        Returns the values at the given positions of the sorted multiset.
+        """
+        ends = list(accumulate(len(block) for block in self._blocks))
+        rv = []
+        for position in positions:
+            k = bisect_right(ends, position)
+            start = ends[k - 1] if k > 0 else 0
+            rv.append(self._blocks[k][position - start])
+        return rv
+
+
+def _exact_quantiles(
+    y: np.ndarray, left: np.ndarray, right: np.ndarray, qs: np.ndarray
+) -> np.ndarray:
+    """
+    Computes the quantiles of each window with a sorted structure that is
+    updated as the window edges advance (the gaps between disjoint windows
+    are skipped). NaNs are kept out of the structure,
+    windows with a NaN (found with a prefix count) return NaN.
+    """
+    nan = np.isnan(y)
+    missing = nan.tolist()
+    has_nan = (_window_sum(nan, left, right) > 0).tolist()
+    counts = right - left
+    positions = qs * np.maximum(counts - 1, 0)[:, None]
+    below = np.floor(positions).astype(int)
+    above = np.minimum(below + 1, np.maximum(counts - 1, 0)[:, None])
+    ranks = np.concatenate((below, above), axis=1).tolist()
+
+    values = y.tolist()
+    ordered = np.full((len(left), 2 * len(qs)), np.nan)
+    window = _SortedBlocks()
+    low = high = 0
+    for i, (l, r) in enumerate(zip(left.tolist(), right.tolist())):
+        if l >= high:
+            # the window starts after everything seen (sparse at_times): jump
+            window = _SortedBlocks()
+            low = high = l
+        while high < r:
+            if not missing[high]:
+                window.add(values[high])
+            high += 1
+        while low < l:
+            if not missing[low]:
+                window.remove(values[low])
+            low += 1
+        if r > l and not has_nan[i]:
+            ordered[i] = window.select(ranks[i])
+
+    a, b = ordered[:, : len(qs)], ordered[:, len(qs) :]
+    return a + (b - a) * (positions - below)
+
+
+def _compress(
+    values: np.ndarray, weights: np.ndarray, size: int
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Sorts each row of weighted values and compresses it to an equi-depth
+    summary with `size` points (each one with 1/size of the row weight).
+    The rank error introduced is at most half the weight of a point.
+    """
+    order = np.argsort(values, axis=1)
+    values = np.take_along_axis(values, order, axis=1)
+    weights = np.take_along_axis(weights, order, axis=1)
+    rows, width = values.shape
+    if width <= size:
+        return values, weights
+
+    cum = np.cumsum(weights, axis=1)
+    total = cum[:, -1:]
+    targets = (np.arange(size) + 0.5) / size * total
+    # row-wise search: shift every row to its own disjoint range
+    offset = np.arange(rows)[:, None] * (np.max(total) + 1.0)
+    idx = np.searchsorted((cum + offset).ravel(), (targets + offset).ravel())
+    idx = np.minimum(idx, np.repeat(np.arange(1, rows + 1) * width - 1, size))
+    values = values.ravel()[idx].reshape(rows, size)
+    weights = np.repeat(total / size, size, axis=1)
+    return values, weights
+
+
+def _edge_counts(
+    y: np.ndarray, k: int, block: int, starts: np.ndarray
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Sorts the block k of the series and counts, for each start position p in
+    `starts` (rows) and each j (columns), how many of its j smallest values
+    have a position >= p. The counts give the edge values of a window below a
+    value, only the rows of the window edges at hand are built.
+    """
+    values = y[k * block : (k + 1) * block] if k >= 0 else y[:0]
+    order = np.argsort(values, kind="stable")
+    counts = np.zeros((len(starts), len(values) + 1), dtype=np.int32)
+    np.cumsum(order >= starts[:, None], axis=1, dtype=np.int32, out=counts[:, 1:])
+    return values[order], counts
+
+
+def _sketch_quantiles(
+    y: np.ndarray, left: np.ndarray, right: np.ndarray, qs: np.ndarray, eps: float
+) -> np.ndarray:
+    """
+    Computes approximate quantiles of each window from mergeable summaries.
+
+    A binary tree of equi-depth summaries is built over the series, its
+    leaves summarize runs of at least four summary sizes, so the tree holds
+    at most about n / 2 points. Each window is covered by its partial edge
+    blocks (exact values), the runs of the series between the blocks and the
+    leaves, and O(log n) tree nodes, whose summaries are merged and compressed
+    once for all the windows that share them. The edge values are merged into
+    the sorted summary by rank (counts over the sorted partial blocks and
+    their positions), vectorized over the windows. The summary size is chosen
+    so that the rank error is at most eps times the window population, the
+    block size is capped so the edge counts stay small.
+    """
+    n = len(y)
+    size = int(np.ceil(1.0 / (2.0 * eps)))
+    while True:
+        levels = int(np.ceil(np.log2(np.ceil(n / size)))) if n > size else 0
+        # one compression per tree level plus the merge of the window nodes
+        needed = int(np.ceil((levels + 1) / (2.0 * eps)))
+        if size >= needed:
+            break
+        size = needed
+
+    block = int(np.clip(size // 4, 1, 1024))
+    ratio = 1
+    while ratio * block < 4 * size:
+        ratio *= 2
+    span = ratio * block
+
+    # leaves are compressed in batches of rows (bounded temporary memory)
+    leaves = -(-n // span)
+    batch = int(np.maximum((1 << 16) // span, 1))
+    tree_values, tree_totals = [], []
+    for start in range(0, leaves, batch):
+        stop = int(np.minimum(start + batch, leaves))
+        values = np.full((stop - start) * span, np.inf)
+        chunk = y[start * span : stop * span]
+        values[: len(chunk)] = chunk
+        weights = np.zeros(len(values))
+        weights[: len(chunk)] = 1.0
+        values, weights = _compress(
+            values.reshape(-1, span), weights.reshape(-1, span), size
+        )
+        tree_values.append(values)
+        tree_totals.append(np.sum(weights, axis=1))
+    # every node summary has `size` points of equal weight: only the totals
+    # of the nodes are kept
+    tree = [(np.concatenate(tree_values), np.concatenate(tree_totals))]
+    while len(tree[-1][0]) > 1:
+        values, totals = tree[-1]
+        if len(values) % 2:
+            values = np.vstack((values, np.full((1, size), np.inf)))
+            totals = np.append(totals, 0.0)
+        weights = np.repeat(totals / size, size).reshape(-1, 2 * size)
+        values, weights = _compress(values.reshape(-1, 2 * size), weights, size)
+        tree.append((values, np.sum(weights, axis=1)))
+
+    rv = np.full((len(left), len(qs)), np.nan)
+    # windows that fit in a summary are computed exactly
+    small = right - left <= size
+    if np.any(small):
+        rv[small] = _exact_quantiles(y, left[small], right[small], qs)
+
+    large = np.flatnonzero(~small)
+    firsts, lasts = -(-left[large] // block), right[large] // block
+    # windows with the same first and last full blocks share the tree nodes
+    # and their edges are a suffix of block first - 1 and a prefix of block last
+    changes = np.flatnonzero((np.diff(firsts) != 0) | (np.diff(lasts) != 0)) + 1
+    bounds = np.concatenate(([0], changes, [len(large)])).tolist() if len(large) else []
+    for a, b in zip(bounds[:-1], bounds[1:]):
+        windows = large[a:b]
+        first, last = int(firsts[a]), int(lasts[a])
+        # leaves inside the full blocks, the rest is read from the series
+        low, high = -(-first // ratio), last // ratio
+        if low < high:
+            runs = [y[first * block : low * span], y[high * span : last * block]]
+        else:
+            runs = [y[first * block : last * block]]
+        nodes = list(runs)
+        nodes_weights = [np.ones(len(run)) for run in runs]
+        for values, totals in tree:
+            if low >= high:
+                break
+            if low % 2:
+                nodes.append(values[low])
+                nodes_weights.append(np.full(size, totals[low] / size))
+                low += 1
+            if high % 2:
+                high -= 1
+                nodes.append(values[high])
+                nodes_weights.append(np.full(size, totals[high] / size))
+            low //= 2
+            high //= 2
+        summary, summary_weights = _compress(
+            np.concatenate(nodes)[None], np.concatenate(nodes_weights)[None], size
+        )
+        summary = summary[0]
+        cum = np.concatenate(([0.0], np.cumsum(summary_weights[0])))
+
+        # edge values of the window <= the k-th smallest value of a partial
+        # block: positions >= pl in block first - 1, < pr in block last
+        pl = left[windows] - (first - 1) * block
+        pr = right[windows] - last * block
+        if first == 0:
+            pl = np.zeros_like(pl)
+        starts, pl_rows = np.unique(pl, return_inverse=True)
+        sorted_prefix, below = _edge_counts(y, first - 1, block, starts)
+        starts, pr_rows = np.unique(pr, return_inverse=True)
+        sorted_suffix, above = _edge_counts(y, last, block, starts)
+        above = np.arange(above.shape[1]) - above
+
+        # merged rank of every candidate value, for a window:
+        # summary weight <= v plus the edge values of the window <= v
+        candidates = np.sort(np.concatenate((summary, sorted_prefix, sorted_suffix)))
+        rank_summary = cum[np.searchsorted(summary, candidates, side="right")]
+        rank_prefix = np.searchsorted(sorted_prefix, candidates, side="right")
+        rank_suffix = np.searchsorted(sorted_suffix, candidates, side="right")
+
+        total = cum[-1] + (len(sorted_prefix) - pl) + pr
+        # at least a member of the window (q = 0 is its minimum)
+        targets = np.maximum(qs * total[:, None], 0.5)
+        # the quantile is the smallest candidate whose rank reaches the target
+        # (the ranks are non-decreasing), found with a vectorized binary search;
+        # the edges add at most `edges` to the summary rank, which bounds it
+        edges = (total - cum[-1])[:, None]
+        lo = np.searchsorted(rank_summary, targets - edges, side="left")
+        hi = np.minimum(
+            np.searchsorted(rank_summary, targets, side="left"), len(candidates) - 1
+        )
+        while np.any(lo < hi):
+            mid = (lo + hi) // 2
+            rank = (
+                rank_summary[mid]
+                + below[pl_rows[:, None], rank_prefix[mid]]
+                + above[pr_rows[:, None], rank_suffix[mid]]
+            )
+            reach = rank >= targets
+            hi = np.where(reach, mid, hi)
+            lo = np.where(reach, lo, mid + 1)
+        rv[windows] = candidates[lo]
+
+    nan = np.isnan(y)
+    if np.any(nan):
+        rv[_window_sum(nan, left, right) > 0] = np.nan
+    return rv
+
+
+class RollingWindow:
+    """
+    Rolling window over a time series.
+
+    The window indices of every observation are computed once and the
+    prefix sums (of the powers of y) and extreme indices are computed on first use
+    and cached, so several operators over the same windows share them.
+
+    Args:
+        values (np.ndarray): array of time series values (x, y)
+        width_before (float): width of rolling window before t_i
+        width_after (float): width of rolling window after t_i
+        at_times (Optional[np.ndarray]): sorted times where the windows are evaluated (the observation times if None)
+        min_obs (Optional[int]): minimum number of observations per window (extended back in time as needed)
+        max_obs (Optional[int]): maximum number of observations per window (the last ones are kept)
+
+    Raises:
+        ValueError: If at_times is not sorted or min_obs/max_obs are invalid.
+    """
+
+    def __init__(
+        self,
+        values: np.ndarray,
+        width_before: float,
+        width_after: float,
+        at_times: Optional[np.ndarray] = None,
+        min_obs: Optional[int] = None,
+        max_obs: Optional[int] = None,
+    ):
+        if min_obs is not None and min_obs < 0:
+            raise ValueError("min_obs must be non-negative.")
+        if max_obs is not None and max_obs < 1:
+            raise ValueError("max_obs must be positive.")
+        if min_obs is not None and max_obs is not None and min_obs > max_obs:
+            raise ValueError("min_obs must not be larger than max_obs.")
+        if values.size == 0:
+            values = np.empty((0, 2))
+        self.values = values
+        self.times = values[:, 0]
+        self.y = values[:, 1]
+        self.width_before = width_before
+        self.width_after = width_after
+        self.min_obs = min_obs
+        self.max_obs = max_obs
+        if at_times is None:
+            self.at_times = self.times
+        else:
+            self.at_times = np.asarray(at_times, dtype=float)
+            # the sweeps (extremes, quantiles) need monotonic window edges
+            if np.any(np.diff(self.at_times) < 0):
+                raise ValueError("at_times must be sorted.")
+        self.left, self.right = _get_window_indices(
+            self.times, width_before, width_after, self.at_times, min_obs, max_obs
+        )
+        self.counts = self.right - self.left
+
+    @cached_property
+    def _sum_y(self) -> np.ndarray:
+        return _window_sum(self.y, self.left, self.right)
+
+    @cached_property
+    def _sum_y2(self) -> np.ndarray:
+        return _window_sum(self.y**2, self.left, self.right)
+
+    @cached_property
+    def _stable_sums(self) -> Tuple[np.ndarray, np.ndarray]:
+        y = self.y - np.mean(self.y) if self.y.size > 0 else self.y
+        return (
+            _window_sum_stable(y, self.left, self.right),
+            _window_sum_stable(y**2, self.left, self.right),
+        )
+
+    @cached_property
+    def _groups(self) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        # windows grouped while their sizes stay within a factor of two and
+        # their right edge moves by less than one window, so each group only
+        # touches a few windows worth of rows (also when min_obs or max_obs
+        # stretch the windows past their time span)
+        size = np.maximum(self.counts, 1)
+        level = np.floor(np.log2(size))
+        travel = np.concatenate(([0], np.cumsum(np.diff(self.right) / size[1:])))
+        travel = np.floor(travel)
+        change = (level[1:] != level[:-1]) | (travel[1:] != travel[:-1])
+        group = np.cumsum(np.concatenate(([False], change)))[: len(size)]
+        return _group_ranges(self.left, self.right, group)
+
+    def _anchored_sums(self, columns: Sequence[np.ndarray], powers: Sequence[Tuple]):
+        """
+        Compensated window sums of products of powers of the columns, each
+        column shifted by the mean of the rows of the window group (a local
+        anchor), so the moments do not cancel on series with a trend.
+        """
+        rows, owner, base = self._groups
+        counts = np.maximum(np.bincount(owner, minlength=owner.max(initial=0) + 1), 1)
+        shifted = []
+        for c in columns:
+            c = c[rows]
+            anchor = np.bincount(owner, weights=c, minlength=len(counts)) / counts
+            shifted.append(c - anchor[owner])
+        left, right = base + self.left, base + self.right
+        rv = []
+        for exponents in powers:
+            x = np.ones(len(rows))
+            for c, k in zip(shifted, exponents):
+                x = x * c**k
+            rv.append(_window_sum_stable(x, left, right))
+        return tuple(rv)
+
+    @cached_property
+    def _power_sums(self) -> Tuple[np.ndarray, ...]:
+        # sums of the powers 1..4 of y (locally anchored)
+        return self._anchored_sums([self.y], [(k,) for k in range(1, 5)])
+
+    @cached_property
+    def _cross_sums(self) -> Tuple[np.ndarray, ...]:
+        # sums of y1, y2, y1², y2² and y1 y2 (locally anchored)
+        if self.values.shape[1] < 3:
+            raise ValueError("Values must have the columns (x, y1, y2).")
+        columns = [self.values[:, 1], self.values[:, 2]]
+        return self._anchored_sums(columns, [(1, 0), (0, 1), (2, 0), (0, 2), (1, 1)])
+
+    @cached_property
+    def _argmax(self) -> np.ndarray:
+        return _rolling_extreme(self.y, self.left, self.right, greater=True)
+
+    @cached_property
+    def _argmin(self) -> np.ndarray:
+        return _rolling_extreme(self.y, self.left, self.right, greater=False)
+
+    def _result(self, results: np.ndarray) -> np.ndarray:
+        if self.times.size == 0:
+            return np.array([])
+        return np.column_stack((self.at_times, results))
+
+    def _var(self, sum_y: np.ndarray, sum_y2: np.ndarray, ddof: int) -> np.ndarray:
+        n = self.counts
+        # Var = (sum(y^2) - (sum(y)^2)/n) / (n - ddof)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            roll_var = np.where(
+                n > ddof, (sum_y2 - (sum_y**2) / n) / (n - ddof), np.nan
+            )
+        # Clip small negative values due to precision
+        return np.maximum(roll_var, 0.0)
+
+    def num_obs(self) -> np.ndarray:
+        """
+        Rolling number of observations (see `num_obs`).
+        """
+        return self._result(self.counts.astype(float))
+
+    def sum(self) -> np.ndarray:
+        """
+        Rolling sum of values (see `sum`).
+        """
+        return self._result(self._sum_y)
+
+    def sum_stable(self) -> np.ndarray:
+        """
+        Rolling sum of values using a compensated prefix sum (see `sum_stable`).
+        """
+        return self._result(_window_sum_stable(self.y, self.left, self.right))
+
+    def mean(self) -> np.ndarray:
+        """
+        Rolling mean of values (see `mean`).
+        """
+        # Handle empty windows with NaN to match C reference
+        with np.errstate(divide="ignore", invalid="ignore"):
+            roll_mean = np.where(self.counts > 0, self._sum_y / self.counts, np.nan)
+        return self._result(roll_mean)
+
+    def var(self, ddof: int = 1) -> np.ndarray:
+        """
+        Rolling variance of values (see `var`).
+        """
+        return self._result(self._var(self._sum_y, self._sum_y2, ddof))
+
+    def std(self, ddof: int = 1) -> np.ndarray:
+        """
+        Rolling standard deviation of values (see `std`).
+        """
+        return self._result(np.sqrt(self._var(self._sum_y, self._sum_y2, ddof)))
+
+    def var_stable(self, ddof: int = 1) -> np.ndarray:
+        """
+        Rolling variance of values using a numerically stable algorithm
+        (see `var_stable`).
+        """
+        return self._result(self._var(*self._stable_sums, ddof))
+
+    def std_stable(self, ddof: int = 1) -> np.ndarray:
+        """
+        Rolling standard deviation of values using a numerically stable
+        algorithm (see `std_stable`).
+        """
+        return self._result(np.sqrt(self._var(*self._stable_sums, ddof)))
+
+    def skew(self) -> np.ndarray:
+        """
+        Rolling skewness of values (see `skew`).
+        """
+        s1, s2, s3, _ = self._power_sums
+        n = self.counts
+        with np.errstate(divide="ignore", invalid="ignore"):
+            mu = s1 / n
+            m2 = s2 / n - mu**2
+            m3 = s3 / n - 3.0 * mu * s2 / n + 2.0 * mu**3
+            g1 = m3 / m2**1.5
+            roll_skew = np.sqrt(n * (n - 1.0)) / (n - 2.0) * g1
+            # windows with (numerically) constant values have no skewness
+            flat = m2 <= 1e-14 * s2 / n
+        return self._result(np.where((n >= 3) & ~flat, roll_skew, np.nan))
+
+    def kurt(self) -> np.ndarray:
+        """
+        Rolling excess kurtosis of values (see `kurt`).
+        """
+        s1, s2, s3, s4 = self._power_sums
+        n = self.counts
+        with np.errstate(divide="ignore", invalid="ignore"):
+            mu = s1 / n
+            m2 = s2 / n - mu**2
+            m4 = s4 / n - 4.0 * mu * s3 / n + 6.0 * mu**2 * s2 / n - 3.0 * mu**4
+            g2 = m4 / m2**2 - 3.0
+            roll_kurt = (n - 1.0) / ((n - 2.0) * (n - 3.0)) * ((n + 1.0) * g2 + 6.0)
+            flat = m2 <= 1e-14 * s2 / n
+        return self._result(np.where((n >= 4) & ~flat, roll_kurt, np.nan))
+
+    def cov(self, ddof: int = 1) -> np.ndarray:
+        """
+        Rolling covariance of two value columns (see `cov`).
+
+        Raises:
+            ValueError: If the values do not have the columns (x, y1, y2).
+        """
+        if self.times.size == 0:
+            return np.array([])
+        sa, sb, _, _, sab = self._cross_sums
+        n = self.counts
+        with np.errstate(divide="ignore", invalid="ignore"):
+            roll_cov = np.where(n > ddof, (sab - sa * sb / n) / (n - ddof), np.nan)
+        return self._result(roll_cov)
+
+    def corr(self) -> np.ndarray:
+        """
+        Rolling Pearson correlation of two value columns (see `corr`).
+
+        Raises:
+            ValueError: If the values do not have the columns (x, y1, y2).
+        """
+        if self.times.size == 0:
+            return np.array([])
+        sa, sb, saa, sbb, sab = self._cross_sums
+        n = self.counts
+        with np.errstate(divide="ignore", invalid="ignore"):
+            caa = saa - sa**2 / n
+            cbb = sbb - sb**2 / n
+            roll_corr = np.clip((sab - sa * sb / n) / np.sqrt(caa * cbb), -1.0, 1.0)
+        flat = (caa <= 1e-14 * saa) | (cbb <= 1e-14 * sbb)
+        return self._result(np.where((n > 1) & ~flat, roll_corr, np.nan))
+
+    def max(self) -> np.ndarray:
+        """
+        Rolling maximum of values (see `max`).
+        """
+        idx = self._argmax
+        return self._result(np.where(idx >= 0, self.y[idx], np.nan))
+
+    def min(self) -> np.ndarray:
+        """
+        Rolling minimum of values (see `min`).
+        """
+        idx = self._argmin
+        return self._result(np.where(idx >= 0, self.y[idx], np.nan))
+
+    def _arg_result(self, idx: np.ndarray) -> np.ndarray:
+        found = idx >= 0
+        return self._result(
+            np.column_stack(
+                (
+                    np.where(found, self.y[idx], np.nan),
+                    np.where(found, idx, np.nan),
+                    np.where(found, self.times[idx], np.nan),
+                )
+            )
+        )
+
+    def argmax(self) -> np.ndarray:
+        """
+        Rolling maximum of values with its index and time (see `argmax`).
+        """
+        return self._arg_result(self._argmax)
+
+    def argmin(self) -> np.ndarray:
+        """
+        Rolling minimum of values with its index and time (see `argmin`).
+        """
+        return self._arg_result(self._argmin)
+
+    def apply(self, func: Callable[[np.ndarray], float]) -> np.ndarray:
+        """
+        Applies a function to the rolling window (see `apply`).
+        """
+        results = np.array(
+            [
+                func(self.y[low:high]) if low < high else np.nan
+                for low, high in zip(self.left, self.right)
+            ]
+        )
+        return self._result(results)
+
+    def quantile(
+        self, q: Union[float, Sequence[float]], eps: Optional[float] = None
+    ) -> np.ndarray:
+        """
+        Rolling quantiles of values (see `quantile`).
+
+        Raises:
+            ValueError: If a quantile is outside [0, 1] or eps is not in (0, 1).
+        """
+        qs = np.atleast_1d(np.asarray(q, dtype=float))
+        if np.any((qs < 0.0) | (qs > 1.0)):
+            raise ValueError("Quantiles must be in the range [0, 1].")
+        if eps is not None and not 0.0 < eps < 1.0:
+            raise ValueError("eps must be in the range (0, 1).")
+
+        if eps is None:
+            results = _exact_quantiles(self.y, self.left, self.right, qs)
+        else:
+            results = _sketch_quantiles(self.y, self.left, self.right, qs, eps)
+
+        if np.ndim(q) == 0:
+            return self._result(results[:, 0])
+        return self._result(results)
+
+    def median(self, eps: Optional[float] = None) -> np.ndarray:
+        """
+        Rolling median of values (see `median`).
+        """
+        return self.quantile(0.5, eps)
+
+    def product(self, eps: Optional[float] = None, log: bool = False) -> np.ndarray:
+        """
+        Rolling product of values (see `product`).
+        """
+        y, left, right = self.y, self.left, self.right
+        nan = np.isnan(y)
+        zero = y == 0 if eps is None else np.abs(y) < eps
+        # NaNs are counted on their own so they do not poison the prefix sums
+        mantissa, exponent = np.frexp(np.where(zero | nan, 1.0, np.abs(y)))
+
+        nans = _window_sum(nan, left, right)
+        zeros = _window_sum(zero, left, right)
+        negatives = _window_sum(y < 0, left, right)
+        log2_mantissa = _window_sum(np.log2(mantissa), left, right)
+        exponents = _window_sum(exponent, left, right)
+        counts = self.counts
+
+        if log:
+            log_abs = np.where(
+                zeros > 0, -np.inf, (log2_mantissa + exponents) * np.log(2.0)
+            )
+            results = np.where((counts > 0) & (nans == 0), log_abs, np.nan)
+        else:
+            # the sum of the log2 mantissas underflows exp2 on long windows,
+            # its integer part goes into the exponent
+            whole = np.floor(log2_mantissa)
+            exponents = np.clip(exponents + whole, -4096, 4096).astype(np.int32)
+            magnitude = np.ldexp(np.exp2(log2_mantissa - whole), exponents)
+            sign = np.where(negatives % 2 == 1, -1.0, 1.0)
+            results = np.where(
+                (counts > 0) & (nans == 0),
+                np.where(zeros > 0, 0.0, sign * magnitude),
+                np.nan,
+            )
+        return self._result(results)
+
+
+def num_obs(
+    values: np.ndarray,
+    width_before: float,
+    width_after: float,
+    at_times: Optional[np.ndarray] = None,
+    min_obs: Optional[int] = None,
+    max_obs: Optional[int] = None,
+) -> np.ndarray:
     """
     Rolling number of observations.
 
@@ -36,21 +826,29 @@ def num_obs(values: np.ndarray, width_before: float, width_after: float) -> np.n
         values (np.ndarray): array of time series values (x, y)
         width_before (float): width of rolling window before t_i
         width_after (float): width of rolling window after t_i
+        at_times (Optional[np.ndarray]): sorted times where the windows are evaluated (the observation times if None)
+        min_obs (Optional[int]): minimum number of observations per window (extended back in time as needed)
+        max_obs (Optional[int]): maximum number of observations per window (the last ones are kept)
 
     Returns:
         np.ndarray: array with (time, count)
-    """
-    if values.size == 0:
-        return np.array([])
-
-    times = values[:, 0]
-    left, right = _get_window_indices(times, width_before, width_after)
-    counts = right - left
 
-    return np.column_stack((times, counts.astype(float)))
+    Raises:
+        ValueError: If at_times is not sorted or min_obs/max_obs are invalid.
+    """
+    return RollingWindow(
+        values, width_before, width_after, at_times, min_obs, max_obs
+    ).num_obs()
 
 
-def sum(values: np.ndarray, width_before: float, width_after: float) -> np.ndarray:
+def sum(
+    values: np.ndarray,
+    width_before: float,
+    width_after: float,
+    at_times: Optional[np.ndarray] = None,
+    min_obs: Optional[int] = None,
+    max_obs: Optional[int] = None,
+) -> np.ndarray:
     """
     Rolling sum of values.
 
@@ -62,41 +860,62 @@ def sum(values: np.ndarray, width_before: float, width_after: float) -> np.ndarr
         values (np.ndarray): array of time series values (x, y)
         width_before (float): width of rolling window before t_i
         width_after (float): width of rolling window after t_i
+        at_times (Optional[np.ndarray]): sorted times where the windows are evaluated (the observation times if None)
+        min_obs (Optional[int]): minimum number of observations per window (extended back in time as needed)
+        max_obs (Optional[int]): maximum number of observations per window (the last ones are kept)
 
     Returns:
         np.ndarray: array with (time, sum)
-    """
-    if values.size == 0:
-        return np.array([])
-
-    times = values[:, 0]
-    y = values[:, 1]
-    left, right = _get_window_indices(times, width_before, width_after)
-
-    cumsum = np.concatenate(([0], np.cumsum(y)))
-    roll_sum = cumsum[right] - cumsum[left]
 
-    return np.column_stack((times, roll_sum))
+    Raises:
+        ValueError: If at_times is not sorted or min_obs/max_obs are invalid.
+    """
+    return RollingWindow(
+        values, width_before, width_after, at_times, min_obs, max_obs
+    ).sum()
 
 
 def sum_stable(
-    values: np.ndarray, width_before: float, width_after: float
+    values: np.ndarray,
+    width_before: float,
+    width_after: float,
+    at_times: Optional[np.ndarray] = None,
+    min_obs: Optional[int] = None,
+    max_obs: Optional[int] = None,
 ) -> np.ndarray:
     """
-    Rolling sum of values using a stable algorithm (alias to sum as cumsum is stable).
+    Rolling sum of values using a compensated prefix sum.
+
+    The rounding errors of the prefix sum are tracked exactly (TwoSum)
+    and added back, so long series do not lose accuracy in each window.
 
     Args:
         values (np.ndarray): array of time series values (x, y)
         width_before (float): width of rolling window before t_i
         width_after (float): width of rolling window after t_i
+        at_times (Optional[np.ndarray]): sorted times where the windows are evaluated (the observation times if None)
+        min_obs (Optional[int]): minimum number of observations per window (extended back in time as needed)
+        max_obs (Optional[int]): maximum number of observations per window (the last ones are kept)
 
     Returns:
         np.ndarray: array with (time, sum)
+
+    Raises:
+        ValueError: If at_times is not sorted or min_obs/max_obs are invalid.
     """
-    return sum(values, width_before, width_after)
+    return RollingWindow(
+        values, width_before, width_after, at_times, min_obs, max_obs
+    ).sum_stable()
 
 
-def mean(values: np.ndarray, width_before: float, width_after: float) -> np.ndarray:
+def mean(
+    values: np.ndarray,
+    width_before: float,
+    width_after: float,
+    at_times: Optional[np.ndarray] = None,
+    min_obs: Optional[int] = None,
+    max_obs: Optional[int] = None,
+) -> np.ndarray:
     """
     Rolling mean of values.
 
@@ -108,30 +927,29 @@ def mean(values: np.ndarray, width_before: float, width_after: float) -> np.ndar
         values (np.ndarray): array of time series values (x, y)
         width_before (float): width of rolling window before t_i
         width_after (float): width of rolling window after t_i
+        at_times (Optional[np.ndarray]): sorted times where the windows are evaluated (the observation times if None)
+        min_obs (Optional[int]): minimum number of observations per window (extended back in time as needed)
+        max_obs (Optional[int]): maximum number of observations per window (the last ones are kept)
 
     Returns:
         np.ndarray: array with (time, mean)
-    """
-    if values.size == 0:
-        return np.array([])
-
-    times = values[:, 0]
-    y = values[:, 1]
-    left, right = _get_window_indices(times, width_before, width_after)
-
-    cumsum = np.concatenate(([0], np.cumsum(y)))
-    roll_sum = cumsum[right] - cumsum[left]
-    counts = right - left
 
-    # Handle empty windows with NaN to match C reference
-    with np.errstate(divide="ignore", invalid="ignore"):
-        roll_mean = np.where(counts > 0, roll_sum / counts, np.nan)
-
-    return np.column_stack((times, roll_mean))
+    Raises:
+        ValueError: If at_times is not sorted or min_obs/max_obs are invalid.
+    """
+    return RollingWindow(
+        values, width_before, width_after, at_times, min_obs, max_obs
+    ).mean()
 
 
 def var(
-    values: np.ndarray, width_before: float, width_after: float, ddof: int = 1
+    values: np.ndarray,
+    width_before: float,
+    width_after: float,
+    ddof: int = 1,
+    at_times: Optional[np.ndarray] = None,
+    min_obs: Optional[int] = None,
+    max_obs: Optional[int] = None,
 ) -> np.ndarray:
     """
     Rolling variance of values.
@@ -145,39 +963,104 @@ def var(
         width_before (float): width of rolling window before t_i
         width_after (float): width of rolling window after t_i
         ddof (int): delta degrees of freedom (reference uses ddof=1 for central moments)
+        at_times (Optional[np.ndarray]): sorted times where the windows are evaluated (the observation times if None)
+        min_obs (Optional[int]): minimum number of observations per window (extended back in time as needed)
+        max_obs (Optional[int]): maximum number of observations per window (the last ones are kept)
 
     Returns:
         np.ndarray: array with (time, variance)
+
+    Raises:
+        ValueError: If at_times is not sorted or min_obs/max_obs are invalid.
     """
-    if values.size == 0:
-        return np.array([])
+    return RollingWindow(
+        values, width_before, width_after, at_times, min_obs, max_obs
+    ).var(ddof)
 
-    times = values[:, 0]
-    y = values[:, 1]
-    left, right = _get_window_indices(times, width_before, width_after)
 
-    cumsum_y = np.concatenate(([0], np.cumsum(y)))
-    cumsum_y2 = np.concatenate(([0], np.cumsum(y**2)))
+def std(
+    values: np.ndarray,
+    width_before: float,
+    width_after: float,
+    ddof: int = 1,
+    at_times: Optional[np.ndarray] = None,
+    min_obs: Optional[int] = None,
+    max_obs: Optional[int] = None,
+) -> np.ndarray:
+    """
+    Rolling standard deviation of values.
 
-    sum_y = cumsum_y[right] - cumsum_y[left]
-    sum_y2 = cumsum_y2[right] - cumsum_y2[left]
-    n = right - left
+    \\[
+    \\sigma(t_i) = \\sqrt{\\sigma^2(t_i)}
+    \\]
 
-    # Var = (sum(y^2) - (sum(y)^2)/n) / (n - ddof)
-    with np.errstate(divide="ignore", invalid="ignore"):
-        roll_var = np.where(n > ddof, (sum_y2 - (sum_y**2) / n) / (n - ddof), np.nan)
+    Args:
+        values (np.ndarray): array of time series values (x, y)
+        width_before (float): width of rolling window before t_i
+        width_after (float): width of rolling window after t_i
+        ddof (int): delta degrees of freedom
+        at_times (Optional[np.ndarray]): sorted times where the windows are evaluated (the observation times if None)
+        min_obs (Optional[int]): minimum number of observations per window (extended back in time as needed)
+        max_obs (Optional[int]): maximum number of observations per window (the last ones are kept)
 
-    # Clip small negative values due to precision
-    roll_var = np.maximum(roll_var, 0.0)
+    Returns:
+        np.ndarray: array with (time, std)
 
-    return np.column_stack((times, roll_var))
+    Raises:
+        ValueError: If at_times is not sorted or min_obs/max_obs are invalid.
+    """
+    return RollingWindow(
+        values, width_before, width_after, at_times, min_obs, max_obs
+    ).std(ddof)
 
 
-def std(
-    values: np.ndarray, width_before: float, width_after: float, ddof: int = 1
+def var_stable(
+    values: np.ndarray,
+    width_before: float,
+    width_after: float,
+    ddof: int = 1,
+    at_times: Optional[np.ndarray] = None,
+    min_obs: Optional[int] = None,
+    max_obs: Optional[int] = None,
 ) -> np.ndarray:
     """
-    Rolling standard deviation of values.
+    Rolling variance of values using a numerically stable algorithm.
+
+    The values are shifted by their mean and the windowed sums of the
+    shifted values and their squares use compensated prefix sums,
+    which avoids the cancellation of `var` on series with a large offset.
+
+    Args:
+        values (np.ndarray): array of time series values (x, y)
+        width_before (float): width of rolling window before t_i
+        width_after (float): width of rolling window after t_i
+        ddof (int): delta degrees of freedom
+        at_times (Optional[np.ndarray]): sorted times where the windows are evaluated (the observation times if None)
+        min_obs (Optional[int]): minimum number of observations per window (extended back in time as needed)
+        max_obs (Optional[int]): maximum number of observations per window (the last ones are kept)
+
+    Returns:
+        np.ndarray: array with (time, variance)
+
+    Raises:
+        ValueError: If at_times is not sorted or min_obs/max_obs are invalid.
+    """
+    return RollingWindow(
+        values, width_before, width_after, at_times, min_obs, max_obs
+    ).var_stable(ddof)
+
+
+def std_stable(
+    values: np.ndarray,
+    width_before: float,
+    width_after: float,
+    ddof: int = 1,
+    at_times: Optional[np.ndarray] = None,
+    min_obs: Optional[int] = None,
+    max_obs: Optional[int] = None,
+) -> np.ndarray:
+    """
+    Rolling standard deviation of values using a numerically stable algorithm.
 
     \\[
     \\sigma(t_i) = \\sqrt{\\sigma^2(t_i)}
@@ -188,16 +1071,178 @@ def std(
         width_before (float): width of rolling window before t_i
         width_after (float): width of rolling window after t_i
         ddof (int): delta degrees of freedom
+        at_times (Optional[np.ndarray]): sorted times where the windows are evaluated (the observation times if None)
+        min_obs (Optional[int]): minimum number of observations per window (extended back in time as needed)
+        max_obs (Optional[int]): maximum number of observations per window (the last ones are kept)
 
     Returns:
         np.ndarray: array with (time, std)
+
+    Raises:
+        ValueError: If at_times is not sorted or min_obs/max_obs are invalid.
+    """
+    return RollingWindow(
+        values, width_before, width_after, at_times, min_obs, max_obs
+    ).std_stable(ddof)
+
+
+def skew(
+    values: np.ndarray,
+    width_before: float,
+    width_after: float,
+    at_times: Optional[np.ndarray] = None,
+    min_obs: Optional[int] = None,
+    max_obs: Optional[int] = None,
+) -> np.ndarray:
+    """
+    Rolling skewness of values (bias corrected).
+
+    \\[
+    G_1(t_i) = \\frac{\\sqrt{N(N-1)}}{N-2} \\frac{m_3(t_i)}{m_2(t_i)^{3/2}}
+    \\]
+
+    where \\( m_k \\) are the central moments of the window, computed from
+    compensated prefix sums of the powers of the values, shifted by a local
+    anchor (the mean of nearby windows) so trending series keep their accuracy.
+    Windows with fewer than 3 observations or constant values are NaN.
+
+    Args:
+        values (np.ndarray): array of time series values (x, y)
+        width_before (float): width of rolling window before t_i
+        width_after (float): width of rolling window after t_i
+        at_times (Optional[np.ndarray]): sorted times where the windows are evaluated (the observation times if None)
+        min_obs (Optional[int]): minimum number of observations per window (extended back in time as needed)
+        max_obs (Optional[int]): maximum number of observations per window (the last ones are kept)
+
+    Returns:
+        np.ndarray: array with (time, skewness)
+
+    Raises:
+        ValueError: If at_times is not sorted or min_obs/max_obs are invalid.
+    """
+    return RollingWindow(
+        values, width_before, width_after, at_times, min_obs, max_obs
+    ).skew()
+
+
+def kurt(
+    values: np.ndarray,
+    width_before: float,
+    width_after: float,
+    at_times: Optional[np.ndarray] = None,
+    min_obs: Optional[int] = None,
+    max_obs: Optional[int] = None,
+) -> np.ndarray:
+    """
+    Rolling excess kurtosis of values (bias corrected).
+
+    \\[
+    G_2(t_i) = \\frac{N-1}{(N-2)(N-3)} \\left((N+1) \\left(\\frac{m_4(t_i)}{m_2(t_i)^2} - 3\\right) + 6\\right)
+    \\]
+
+    Windows with fewer than 4 observations or constant values are NaN.
+
+    Args:
+        values (np.ndarray): array of time series values (x, y)
+        width_before (float): width of rolling window before t_i
+        width_after (float): width of rolling window after t_i
+        at_times (Optional[np.ndarray]): sorted times where the windows are evaluated (the observation times if None)
+        min_obs (Optional[int]): minimum number of observations per window (extended back in time as needed)
+        max_obs (Optional[int]): maximum number of observations per window (the last ones are kept)
+
+    Returns:
+        np.ndarray: array with (time, kurtosis)
+
+    Raises:
+        ValueError: If at_times is not sorted or min_obs/max_obs are invalid.
+    """
+    return RollingWindow(
+        values, width_before, width_after, at_times, min_obs, max_obs
+    ).kurt()
+
+
+def cov(
+    values: np.ndarray,
+    width_before: float,
+    width_after: float,
+    ddof: int = 1,
+    at_times: Optional[np.ndarray] = None,
+    min_obs: Optional[int] = None,
+    max_obs: Optional[int] = None,
+) -> np.ndarray:
+    """
+    Rolling covariance of two value columns sampled at the same times.
+
+    \\[
+    \\sigma_{12}(t_i) = \\frac{1}{N(t_i) - ddof} \\sum_{j: t_j \\in (t_i - w_b, t_i + w_a]} (y_{1,j} - \\mu_1(t_i))(y_{2,j} - \\mu_2(t_i))
+    \\]
+
+    Args:
+        values (np.ndarray): array of time series values (x, y1, y2)
+        width_before (float): width of rolling window before t_i
+        width_after (float): width of rolling window after t_i
+        ddof (int): delta degrees of freedom
+        at_times (Optional[np.ndarray]): sorted times where the windows are evaluated (the observation times if None)
+        min_obs (Optional[int]): minimum number of observations per window (extended back in time as needed)
+        max_obs (Optional[int]): maximum number of observations per window (the last ones are kept)
+
+    Returns:
+        np.ndarray: array with (time, covariance)
+
+    Raises:
+        ValueError: If at_times is not sorted or min_obs/max_obs are invalid.
+        ValueError: If the values do not have the columns (x, y1, y2).
+    """
+    return RollingWindow(
+        values, width_before, width_after, at_times, min_obs, max_obs
+    ).cov(ddof)
+
+
+def corr(
+    values: np.ndarray,
+    width_before: float,
+    width_after: float,
+    at_times: Optional[np.ndarray] = None,
+    min_obs: Optional[int] = None,
+    max_obs: Optional[int] = None,
+) -> np.ndarray:
+    """
+    Rolling Pearson correlation of two value columns sampled at the same times.
+
+    \\[
+    \\rho(t_i) = \\frac{\\sigma_{12}(t_i)}{\\sigma_1(t_i) \\sigma_2(t_i)}
+    \\]
+
+    Windows with fewer than 2 observations or a constant column are NaN.
+
+    Args:
+        values (np.ndarray): array of time series values (x, y1, y2)
+        width_before (float): width of rolling window before t_i
+        width_after (float): width of rolling window after t_i
+        at_times (Optional[np.ndarray]): sorted times where the windows are evaluated (the observation times if None)
+        min_obs (Optional[int]): minimum number of observations per window (extended back in time as needed)
+        max_obs (Optional[int]): maximum number of observations per window (the last ones are kept)
+
+    Returns:
+        np.ndarray: array with (time, correlation)
+
+    Raises:
+        ValueError: If at_times is not sorted or min_obs/max_obs are invalid.
+        ValueError: If the values do not have the columns (x, y1, y2).
     """
-    v = var(values, width_before, width_after, ddof)
-    v[:, 1] = np.sqrt(v[:, 1])
-    return v
+    return RollingWindow(
+        values, width_before, width_after, at_times, min_obs, max_obs
+    ).corr()
 
 
-def max(values: np.ndarray, width_before: float, width_after: float) -> np.ndarray:
+def max(
+    values: np.ndarray,
+    width_before: float,
+    width_after: float,
+    at_times: Optional[np.ndarray] = None,
+    min_obs: Optional[int] = None,
+    max_obs: Optional[int] = None,
+) -> np.ndarray:
     """
     Rolling maximum of values.
 
@@ -209,27 +1254,29 @@ def max(values: np.ndarray, width_before: float, width_after: float) -> np.ndarr
         values (np.ndarray): array of time series values (x, y)
         width_before (float): width of rolling window before t_i
         width_after (float): width of rolling window after t_i
+        at_times (Optional[np.ndarray]): sorted times where the windows are evaluated (the observation times if None)
+        min_obs (Optional[int]): minimum number of observations per window (extended back in time as needed)
+        max_obs (Optional[int]): maximum number of observations per window (the last ones are kept)
 
     Returns:
         np.ndarray: array with (time, max)
-    """
-    if values.size == 0:
-        return np.array([])
-
-    times = values[:, 0]
-    y = values[:, 1]
-    left, right = _get_window_indices(times, width_before, width_after)
 
-    roll_max = np.array(
-        [
-            np.max(y[low:high]) if low < high else np.nan
-            for low, high in zip(left, right)
-        ]
-    )
-    return np.column_stack((times, roll_max))
+    Raises:
+        ValueError: If at_times is not sorted or min_obs/max_obs are invalid.
+    """
+    return RollingWindow(
+        values, width_before, width_after, at_times, min_obs, max_obs
+    ).max()
 
 
-def min(values: np.ndarray, width_before: float, width_after: float) -> np.ndarray:
+def min(
+    values: np.ndarray,
+    width_before: float,
+    width_after: float,
+    at_times: Optional[np.ndarray] = None,
+    min_obs: Optional[int] = None,
+    max_obs: Optional[int] = None,
+) -> np.ndarray:
     """
     Rolling minimum of values.
 
@@ -241,24 +1288,85 @@ def min(values: np.ndarray, width_before: float, width_after: float) -> np.ndarr
         values (np.ndarray): array of time series values (x, y)
         width_before (float): width of rolling window before t_i
         width_after (float): width of rolling window after t_i
+        at_times (Optional[np.ndarray]): sorted times where the windows are evaluated (the observation times if None)
+        min_obs (Optional[int]): minimum number of observations per window (extended back in time as needed)
+        max_obs (Optional[int]): maximum number of observations per window (the last ones are kept)
 
     Returns:
         np.ndarray: array with (time, min)
+
+    Raises:
+        ValueError: If at_times is not sorted or min_obs/max_obs are invalid.
     """
-    if values.size == 0:
-        return np.array([])
+    return RollingWindow(
+        values, width_before, width_after, at_times, min_obs, max_obs
+    ).min()
 
-    times = values[:, 0]
-    y = values[:, 1]
-    left, right = _get_window_indices(times, width_before, width_after)
 
-    roll_min = np.array(
-        [
-            np.min(y[low:high]) if low < high else np.nan
-            for low, high in zip(left, right)
-        ]
-    )
-    return np.column_stack((times, roll_min))
+def argmax(
+    values: np.ndarray,
+    width_before: float,
+    width_after: float,
+    at_times: Optional[np.ndarray] = None,
+    min_obs: Optional[int] = None,
+    max_obs: Optional[int] = None,
+) -> np.ndarray:
+    """
+    Rolling maximum of values with the index and time where it happens.
+
+    The extreme of each window comes from the same monotonic deque sweep as
+    `max`, ties return the first observation of the window.
+
+    Args:
+        values (np.ndarray): array of time series values (x, y)
+        width_before (float): width of rolling window before t_i
+        width_after (float): width of rolling window after t_i
+        at_times (Optional[np.ndarray]): sorted times where the windows are evaluated (the observation times if None)
+        min_obs (Optional[int]): minimum number of observations per window (extended back in time as needed)
+        max_obs (Optional[int]): maximum number of observations per window (the last ones are kept)
+
+    Returns:
+        np.ndarray: array with (time, max, index, time of the max), NaN for empty windows or windows with a NaN
+
+    Raises:
+        ValueError: If at_times is not sorted or min_obs/max_obs are invalid.
+    """
+    return RollingWindow(
+        values, width_before, width_after, at_times, min_obs, max_obs
+    ).argmax()
+
+
+def argmin(
+    values: np.ndarray,
+    width_before: float,
+    width_after: float,
+    at_times: Optional[np.ndarray] = None,
+    min_obs: Optional[int] = None,
+    max_obs: Optional[int] = None,
+) -> np.ndarray:
+    """
+    Rolling minimum of values with the index and time where it happens.
+
+    The extreme of each window comes from the same monotonic deque sweep as
+    `min`, ties return the first observation of the window.
+
+    Args:
+        values (np.ndarray): array of time series values (x, y)
+        width_before (float): width of rolling window before t_i
+        width_after (float): width of rolling window after t_i
+        at_times (Optional[np.ndarray]): sorted times where the windows are evaluated (the observation times if None)
+        min_obs (Optional[int]): minimum number of observations per window (extended back in time as needed)
+        max_obs (Optional[int]): maximum number of observations per window (the last ones are kept)
+
+    Returns:
+        np.ndarray: array with (time, min, index, time of the min), NaN for empty windows or windows with a NaN
+
+    Raises:
+        ValueError: If at_times is not sorted or min_obs/max_obs are invalid.
+    """
+    return RollingWindow(
+        values, width_before, width_after, at_times, min_obs, max_obs
+    ).argmin()
 
 
 def apply(
@@ -266,6 +1374,9 @@ def apply(
     width_before: float,
     width_after: float,
     func: Callable[[np.ndarray], float],
+    at_times: Optional[np.ndarray] = None,
+    min_obs: Optional[int] = None,
+    max_obs: Optional[int] = None,
 ) -> np.ndarray:
     """
     Applies a function to a rolling window.
@@ -275,21 +1386,100 @@ def apply(
         width_before (float): width of rolling window before t_i
         width_after (float): width of rolling window after t_i
         func (Callable): function to apply to the y-values in the window
+        at_times (Optional[np.ndarray]): sorted times where the windows are evaluated (the observation times if None)
+        min_obs (Optional[int]): minimum number of observations per window (extended back in time as needed)
+        max_obs (Optional[int]): maximum number of observations per window (the last ones are kept)
 
     Returns:
         np.ndarray: array with (time, result)
+
+    Raises:
+        ValueError: If at_times is not sorted or min_obs/max_obs are invalid.
+    """
+    return RollingWindow(
+        values, width_before, width_after, at_times, min_obs, max_obs
+    ).apply(func)
+
+
+def quantile(
+    values: np.ndarray,
+    width_before: float,
+    width_after: float,
+    q: Union[float, Sequence[float]],
+    eps: Optional[float] = None,
+    at_times: Optional[np.ndarray] = None,
+    min_obs: Optional[int] = None,
+    max_obs: Optional[int] = None,
+) -> np.ndarray:
+    """
+    Rolling quantiles of values.
+
+    The values of the window are kept in a sorted structure that is updated
+    as the window edges advance, so the cost is O(n log w) instead of sorting
+    every window. The quantiles are interpolated linearly between order
+    statistics (as `np.quantile`), all the q values share the same structure.
+
+    When eps is given, the quantiles are approximated from mergeable
+    summaries of blocks of the series, whose memory does not depend on the
+    window population. The rank of the result is within
+    \\( \\epsilon N(t_i) \\) of the exact rank.
+
+    Args:
+        values (np.ndarray): array of time series values (x, y)
+        width_before (float): width of rolling window before t_i
+        width_after (float): width of rolling window after t_i
+        q (Union[float, Sequence[float]]): quantile(s) to compute, in [0, 1]
+        eps (Optional[float]): rank error bound of the approximation (exact if None)
+        at_times (Optional[np.ndarray]): sorted times where the windows are evaluated (the observation times if None)
+        min_obs (Optional[int]): minimum number of observations per window (extended back in time as needed)
+        max_obs (Optional[int]): maximum number of observations per window (the last ones are kept)
+
+    Returns:
+        np.ndarray: array with (time, quantile), with one column per q when q is a sequence
+
+    Raises:
+        ValueError: If at_times is not sorted or min_obs/max_obs are invalid.
+        ValueError: If a quantile is outside [0, 1] or eps is not in (0, 1).
+    """
+    return RollingWindow(
+        values, width_before, width_after, at_times, min_obs, max_obs
+    ).quantile(q, eps)
+
+
+def median(
+    values: np.ndarray,
+    width_before: float,
+    width_after: float,
+    eps: Optional[float] = None,
+    at_times: Optional[np.ndarray] = None,
+    min_obs: Optional[int] = None,
+    max_obs: Optional[int] = None,
+) -> np.ndarray:
     """
-    if values.size == 0:
-        return np.array([])
+    Rolling median of values.
+
+    \\[
+    \\tilde{y}(t_i) = \\text{median} \\{y_j : t_j \\in (t_i - w_b, t_i + w_a]\\}
+    \\]
 
-    times = values[:, 0]
-    y = values[:, 1]
-    left, right = _get_window_indices(times, width_before, width_after)
+    Args:
+        values (np.ndarray): array of time series values (x, y)
+        width_before (float): width of rolling window before t_i
+        width_after (float): width of rolling window after t_i
+        eps (Optional[float]): rank error bound of the approximation (exact if None)
+        at_times (Optional[np.ndarray]): sorted times where the windows are evaluated (the observation times if None)
+        min_obs (Optional[int]): minimum number of observations per window (extended back in time as needed)
+        max_obs (Optional[int]): maximum number of observations per window (the last ones are kept)
 
-    results = np.array(
-        [func(y[low:high]) if low < high else np.nan for low, high in zip(left, right)]
-    )
-    return np.column_stack((times, results))
+    Returns:
+        np.ndarray: array with (time, median)
+
+    Raises:
+        ValueError: If at_times is not sorted or min_obs/max_obs are invalid.
+    """
+    return RollingWindow(
+        values, width_before, width_after, at_times, min_obs, max_obs
+    ).median(eps)
 
 
 def product(
@@ -297,6 +1487,10 @@ def product(
     width_before: float,
     width_after: float,
     eps: Optional[float] = None,
+    log: bool = False,
+    at_times: Optional[np.ndarray] = None,
+    min_obs: Optional[int] = None,
+    max_obs: Optional[int] = None,
 ) -> np.ndarray:
     """
     Rolling product of values.
@@ -305,28 +1499,26 @@ def product(
     P(t_i) = \\prod_{j: t_j \\in (t_i - w_b, t_i + w_a]} y_j
     \\]
 
+    The product is computed from prefix counts of zeros and negative values
+    and a prefix sum of \\( \\log_2 \\) of the mantissas and the exponents of
+    \\( |y_j| \\), so each window costs O(1).
+
     Args:
         values (np.ndarray): array of time series values (x, y)
         width_before (float): width of rolling window before t_i
         width_after (float): width of rolling window after t_i
-        eps (Optional[float]): epsilon for zero detection (kept for compatibility)
+        eps (Optional[float]): values with \\( |y_j| < eps \\) are treated as zero
+        log (bool): return \\( \\log |P(t_i)| \\) instead, which does not overflow
+        at_times (Optional[np.ndarray]): sorted times where the windows are evaluated (the observation times if None)
+        min_obs (Optional[int]): minimum number of observations per window (extended back in time as needed)
+        max_obs (Optional[int]): maximum number of observations per window (the last ones are kept)
 
     Returns:
         np.ndarray: array with (time, product)
+
+    Raises:
+        ValueError: If at_times is not sorted or min_obs/max_obs are invalid.
     """
-    if values.size == 0:
-        return np.array([])
-
-    times = values[:, 0]
-    y = values[:, 1]
-    left, right = _get_window_indices(times, width_before, width_after)
-
-    # The original implementation used eps for zero detection.
-    # We maintain the signature for backward compatibility.
-    results = np.array(
-        [
-            np.prod(y[low:high]) if low < high else np.nan
-            for low, high in zip(left, right)
-        ]
-    )
-    return np.column_stack((times, results))
+    return RollingWindow(
+        values, width_before, width_after, at_times, min_obs, max_obs
+    ).product(eps, log)
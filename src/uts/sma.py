@@ -6,6 +6,8 @@ __email__ = "mariolpantunes@gmail.com"
 __status__ = "Development"
 
 
+from typing import List, Tuple
+
 import numpy as np
 
 
@@ -25,23 +27,11 @@ def _trapezoid_right(x1: float, x2: float, x3: float, y1: float, y3: float) -> f
     return (x2 - x1) * (y1 + y2) / 2.0
 
 
-def last(values: np.ndarray, width_before: float, width_after: float) -> np.ndarray:
+def _last_reference(
+    values: np.ndarray, width_before: float, width_after: float
+) -> np.ndarray:
     """
-    Computes the simple moving average using the 'last' interpolation scheme.
-
-    \\[
-    SMA(t_i) = \\frac{1}{w_b + w_a} \\int_{t_i - w_b}^{t_i + w_a} y_{last}(t) dt
-    \\]
-
-    Matches the reference C implementation.
-
-    Args:
-        values (np.ndarray): array of time series values (x, y)
-        width_before (float): width of rolling window before t_i
-        width_after (float): width of rolling window after t_i
-
-    Returns:
-        np.ndarray: the result array (time, sma)
+    Loop implementation of `last`, kept as the reference path.
     """
     n = len(values)
     if n == 0:
@@ -81,23 +71,11 @@ def last(values: np.ndarray, width_before: float, width_after: float) -> np.ndar
     return rv
 
 
-def next(values: np.ndarray, width_before: float, width_after: float) -> np.ndarray:
+def _next_reference(
+    values: np.ndarray, width_before: float, width_after: float
+) -> np.ndarray:
     """
-    Computes the simple moving average using the 'next' interpolation scheme.
-
-    \\[
-    SMA(t_i) = \\frac{1}{w_b + w_a} \\int_{t_i - w_b}^{t_i + w_a} y_{next}(t) dt
-    \\]
-
-    Matches the reference C implementation.
-
-    Args:
-        values (np.ndarray): array of time series values (x, y)
-        width_before (float): width of rolling window before t_i
-        width_after (float): width of rolling window after t_i
-
-    Returns:
-        np.ndarray: the result array (time, sma)
+    Loop implementation of `next`, kept as the reference path.
     """
     n = len(values)
     if n == 0:
@@ -137,23 +115,11 @@ def next(values: np.ndarray, width_before: float, width_after: float) -> np.ndar
     return rv
 
 
-def linear(values: np.ndarray, width_before: float, width_after: float) -> np.ndarray:
+def _linear_reference(
+    values: np.ndarray, width_before: float, width_after: float
+) -> np.ndarray:
     """
-    Computes the simple moving average using the 'linear' interpolation scheme.
-
-    \\[
-    SMA(t_i) = \\frac{1}{w_b + w_a} \\int_{t_i - w_b}^{t_i + w_a} y_{linear}(t) dt
-    \\]
-
-    Matches the reference C implementation.
-
-    Args:
-        values (np.ndarray): array of time series values (x, y)
-        width_before (float): width of rolling window before t_i
-        width_after (float): width of rolling window after t_i
-
-    Returns:
-        np.ndarray: the result array (time, sma)
+    Loop implementation of `linear`, kept as the reference path.
     """
     n = len(values)
     if n == 0:
@@ -205,3 +171,522 @@ def linear(values: np.ndarray, width_before: float, width_after: float) -> np.nd
         rv[i] = [times[i], roll_area / (width_before + width_after)]
 
     return rv
+
+
+def _segment(ya: np.ndarray, yb: np.ndarray, dt: np.ndarray, power: int) -> np.ndarray:
+    """
+    Integral of the p-th power of a linear segment from ya to yb of length dt.
+    """
+    if power == 1:
+        return (ya + yb) / 2.0 * dt
+    return (ya * ya + ya * yb + yb * yb) / 3.0 * dt
+
+
+def _prefix_area(
+    times: np.ndarray, y: np.ndarray, scheme: str, power: int = 1
+) -> np.ndarray:
+    """
+    Computes the cumulative integral of the interpolated series from t_0 to each t_k.
+
+    Args:
+        times (np.ndarray): observation times
+        y (np.ndarray): observation values
+        scheme (str): interpolation scheme ('last', 'next' or 'linear')
+        power (int): integrate the series (1) or its square (2)
+
+    Returns:
+        np.ndarray: the cumulative area at each observation time
+    """
+    dt = np.diff(times)
+    if scheme == "last":
+        seg = y[:-1] ** power * dt
+    elif scheme == "next":
+        seg = y[1:] ** power * dt
+    elif scheme == "linear":
+        seg = _segment(y[:-1], y[1:], dt, power)
+    else:
+        raise ValueError(f"Unknown interpolation scheme: {scheme}")
+    return np.concatenate(([0.0], np.cumsum(seg)))
+
+
+def _window_area(
+    times: np.ndarray,
+    y: np.ndarray,
+    area: np.ndarray,
+    t_left: np.ndarray,
+    t_right: np.ndarray,
+    scheme: str,
+    power: int = 1,
+) -> np.ndarray:
+    """
+    Computes the integral of the interpolated series over [t_left, t_right].
+
+    The full segments inside the window come from the cumulative area,
+    the partial segments at both edges are added in bulk.
+    The boundary rules are the same as the reference C implementation,
+    outside the observations the first and last values are held.
+
+    Args:
+        times (np.ndarray): observation times
+        y (np.ndarray): observation values
+        area (np.ndarray): cumulative area (see `_prefix_area`)
+        t_left (np.ndarray): start of each window
+        t_right (np.ndarray): end of each window
+        scheme (str): interpolation scheme ('last', 'next' or 'linear')
+        power (int): integrate the series (1) or its square (2)
+
+    Returns:
+        np.ndarray: the area of each window
+    """
+    n = len(times)
+    yp = y**power
+    outside = yp[0] * np.maximum(np.minimum(t_right, times[0]) - t_left, 0.0)
+    outside += yp[-1] * np.maximum(t_right - np.maximum(t_left, times[-1]), 0.0)
+    t_left = np.clip(t_left, times[0], times[-1])
+    t_right = np.clip(t_right, times[0], times[-1])
+
+    # first observation at or after t_left, last observation at or before t_right
+    left = np.searchsorted(times, t_left, side="left")
+    right = np.searchsorted(times, t_right, side="right") - 1
+    prev = np.maximum(left - 1, 0)
+    after = np.minimum(right + 1, n - 1)
+
+    if scheme == "linear":
+        # vectorized _trapezoid_left
+        x1, x3 = times[prev], times[left]
+        flat = (t_left == x3) | (t_left < x1)
+        w = np.divide(x3 - t_left, x3 - x1, out=np.zeros_like(t_left), where=~flat)
+        y2 = y[prev] * w + y[left] * (1.0 - w)
+        left_area = np.where(
+            flat, (x3 - t_left) * yp[prev], _segment(y2, y[left], x3 - t_left, power)
+        )
+        # vectorized _trapezoid_right
+        x1, x3 = times[right], times[after]
+        flat = (t_right == x1) | (t_right > x3)
+        w = np.divide(x3 - t_right, x3 - x1, out=np.zeros_like(t_right), where=~flat)
+        y2 = y[right] * w + y[after] * (1.0 - w)
+        right_area = np.where(
+            flat,
+            (t_right - x1) * yp[right],
+            _segment(y[right], y2, t_right - x1, power),
+        )
+    else:
+        y_left = yp[prev] if scheme == "last" else yp[left]
+        left_area = y_left * (times[left] - t_left)
+        right_area = yp[right] * (t_right - times[right])
+
+    return area[right] - area[left] + left_area + right_area + outside
+
+
+def _sma(
+    values: np.ndarray, width_before: float, width_after: float, scheme: str
+) -> np.ndarray:
+    n = len(values)
+    if n == 0:
+        return np.array([])
+
+    times = values[:, 0]
+    y = values[:, 1]
+    area = _prefix_area(times, y, scheme)
+    roll_area = _window_area(
+        times, y, area, times - width_before, times + width_after, scheme
+    )
+
+    rv = np.column_stack((times, roll_area / (width_before + width_after)))
+    rv[0] = values[0]
+    return rv
+
+
+def last(values: np.ndarray, width_before: float, width_after: float) -> np.ndarray:
+    """
+    Computes the simple moving average using the 'last' interpolation scheme.
+
+    \\[
+    SMA(t_i) = \\frac{1}{w_b + w_a} \\int_{t_i - w_b}^{t_i + w_a} y_{last}(t) dt
+    \\]
+
+    Matches the reference C implementation.
+    The window areas come from a cumulative integral, `_last_reference`
+    holds the equivalent loop.
+
+    Args:
+        values (np.ndarray): array of time series values (x, y)
+        width_before (float): width of rolling window before t_i
+        width_after (float): width of rolling window after t_i
+
+    Returns:
+        np.ndarray: the result array (time, sma)
+    """
+    return _sma(values, width_before, width_after, "last")
+
+
+def next(values: np.ndarray, width_before: float, width_after: float) -> np.ndarray:
+    """
+    Computes the simple moving average using the 'next' interpolation scheme.
+
+    \\[
+    SMA(t_i) = \\frac{1}{w_b + w_a} \\int_{t_i - w_b}^{t_i + w_a} y_{next}(t) dt
+    \\]
+
+    Matches the reference C implementation.
+    The window areas come from a cumulative integral, `_next_reference`
+    holds the equivalent loop.
+
+    Args:
+        values (np.ndarray): array of time series values (x, y)
+        width_before (float): width of rolling window before t_i
+        width_after (float): width of rolling window after t_i
+
+    Returns:
+        np.ndarray: the result array (time, sma)
+    """
+    return _sma(values, width_before, width_after, "next")
+
+
+def linear(values: np.ndarray, width_before: float, width_after: float) -> np.ndarray:
+    """
+    Computes the simple moving average using the 'linear' interpolation scheme.
+
+    \\[
+    SMA(t_i) = \\frac{1}{w_b + w_a} \\int_{t_i - w_b}^{t_i + w_a} y_{linear}(t) dt
+    \\]
+
+    Matches the reference C implementation.
+    The window areas come from a cumulative integral, `_linear_reference`
+    holds the equivalent loop.
+
+    Args:
+        values (np.ndarray): array of time series values (x, y)
+        width_before (float): width of rolling window before t_i
+        width_after (float): width of rolling window after t_i
+
+    Returns:
+        np.ndarray: the result array (time, sma)
+    """
+    return _sma(values, width_before, width_after, "linear")
+
+
+def bank(
+    values: np.ndarray, windows: List[Tuple[float, float]], scheme: str = "linear"
+) -> np.ndarray:
+    """
+    Computes the simple moving averages for several windows in a single pass.
+
+    The cumulative area is computed once and the edges of all the windows
+    are found with a single search, column \\( k \\) matches the SMA with
+    the k-th (width_before, width_after) pair.
+
+    Args:
+        values (np.ndarray): array of time series values (x, y)
+        windows (List[Tuple[float, float]]): (width_before, width_after) pairs
+        scheme (str): interpolation scheme ('last', 'next' or 'linear')
+
+    Returns:
+        np.ndarray: the result matrix (n, len(windows)) with one SMA per column
+    """
+    n = len(values)
+    if n == 0:
+        return np.array([])
+
+    times = values[:, 0]
+    y = values[:, 1]
+    windows = np.asarray(windows, dtype=float).reshape(-1, 2)
+    width_before = windows[:, :1]
+    width_after = windows[:, 1:]
+
+    area = _prefix_area(times, y, scheme)
+    roll_area = _window_area(
+        times,
+        y,
+        area,
+        (times - width_before).ravel(),
+        (times + width_after).ravel(),
+        scheme,
+    ).reshape(len(windows), n)
+
+    rv = (roll_area / (width_before + width_after)).T
+    rv[0] = y[0]
+    return rv
+
+
+def sample(
+    values: np.ndarray,
+    out_times: np.ndarray,
+    width_before: float,
+    width_after: float,
+    scheme: str = "linear",
+) -> np.ndarray:
+    """
+    Computes the simple moving average at arbitrary output times.
+
+    \\[
+    SMA(q) = \\frac{1}{w_b + w_a} \\int_{q - w_b}^{q + w_a} y(t) dt
+    \\]
+
+    Each window integral comes from the cumulative area of the observations,
+    so the cost is O(n + m log n) for m output times.
+    Outside the observations the first and last values are held.
+
+    Args:
+        values (np.ndarray): array of time series values (x, y)
+        out_times (np.ndarray): output times
+        width_before (float): width of rolling window before each output time
+        width_after (float): width of rolling window after each output time
+        scheme (str): interpolation scheme ('last', 'next' or 'linear')
+
+    Returns:
+        np.ndarray: the result array (time, sma)
+    """
+    out_times = np.asarray(out_times, dtype=float)
+    if len(values) == 0 or len(out_times) == 0:
+        return np.array([])
+
+    times = values[:, 0]
+    y = values[:, 1]
+    area = _prefix_area(times, y, scheme)
+    roll_area = _window_area(
+        times, y, area, out_times - width_before, out_times + width_after, scheme
+    )
+    return np.column_stack((out_times, roll_area / (width_before + width_after)))
+
+
+def var(
+    values: np.ndarray,
+    width_before: float,
+    width_after: float,
+    scheme: str = "linear",
+) -> np.ndarray:
+    """
+    Computes the time-weighted rolling variance.
+
+    \\[
+    \\sigma^2(t_i) = \\frac{1}{w_b + w_a} \\int_{t_i - w_b}^{t_i + w_a} y(t)^2 dt - SMA(t_i)^2
+    \\]
+
+    Both integrals come from cumulative areas (of the series and of its
+    square) with the same boundary rules as the SMA functions,
+    the series is shifted by its mean to reduce cancellation.
+
+    Args:
+        values (np.ndarray): array of time series values (x, y)
+        width_before (float): width of rolling window before t_i
+        width_after (float): width of rolling window after t_i
+        scheme (str): interpolation scheme ('last', 'next' or 'linear')
+
+    Returns:
+        np.ndarray: the result array (time, variance)
+    """
+    n = len(values)
+    if n == 0:
+        return np.array([])
+
+    times = values[:, 0]
+    y = values[:, 1] - np.mean(values[:, 1])
+    t_left = times - width_before
+    t_right = times + width_after
+    width = width_before + width_after
+
+    area = _prefix_area(times, y, scheme)
+    area2 = _prefix_area(times, y, scheme, power=2)
+    mean = _window_area(times, y, area, t_left, t_right, scheme) / width
+    mean2 = _window_area(times, y, area2, t_left, t_right, scheme, power=2) / width
+
+    # Clip small negative values due to precision
+    return np.column_stack((times, np.maximum(mean2 - mean**2, 0.0)))
+
+
+def std(
+    values: np.ndarray,
+    width_before: float,
+    width_after: float,
+    scheme: str = "linear",
+) -> np.ndarray:
+    """
+    Computes the time-weighted rolling standard deviation.
+
+    \\[
+    \\sigma(t_i) = \\sqrt{\\sigma^2(t_i)}
+    \\]
+
+    Args:
+        values (np.ndarray): array of time series values (x, y)
+        width_before (float): width of rolling window before t_i
+        width_after (float): width of rolling window after t_i
+        scheme (str): interpolation scheme ('last', 'next' or 'linear')
+
+    Returns:
+        np.ndarray: the result array (time, std)
+    """
+    v = var(values, width_before, width_after, scheme)
+    if len(v) > 0:
+        v[:, 1] = np.sqrt(v[:, 1])
+    return v
+
+
+class SMAState:
+    """
+    Incremental simple moving average for live feeds.
+
+    Only the observations that can still fall inside a window are kept,
+    so memory is O(window) instead of O(history).
+    The SMA at \\( t_i \\) is emitted as soon as an observation after
+    \\( t_i + w_a \\) arrives; `flush` emits the remaining values at the end
+    of the stream. The emitted values match the batch functions
+    (`last`, `next` and `linear`) on the concatenated series.
+
+    Args:
+        width_before (float): width of rolling window before t_i
+        width_after (float): width of rolling window after t_i
+        scheme (str): interpolation scheme ('last', 'next' or 'linear')
+        capacity (int): initial capacity of the window buffer
+    """
+
+    def __init__(
+        self,
+        width_before: float,
+        width_after: float,
+        scheme: str = "linear",
+        capacity: int = 1024,
+    ):
+        if scheme not in ("last", "next", "linear"):
+            raise ValueError(f"Unknown interpolation scheme: {scheme}")
+        self.width_before = width_before
+        self.width_after = width_after
+        self.scheme = scheme
+        self._times = np.empty(capacity)
+        self._y = np.empty(capacity)
+        self._area = np.empty(capacity)
+        # live observations are [_start, _end), pending outputs are [_next, _end)
+        self._start = 0
+        self._end = 0
+        self._next = 0
+
+    @property
+    def pending(self) -> int:
+        """
+        Number of observations waiting for their SMA.
+        """
+        return self._end - self._next
+
+    @property
+    def latency(self) -> float:
+        """
+        Time elapsed between the oldest pending observation and the last one.
+        """
+        if self.pending == 0:
+            return 0.0
+        return float(self._times[self._end - 1] - self._times[self._next])
+
+    def update(self, t: float, y: float) -> np.ndarray:
+        """
+        Adds a single observation.
+
+        Args:
+            t (float): time of the observation
+            y (float): value of the observation
+
+        Returns:
+            np.ndarray: the SMA values that became available (time, sma)
+        """
+        return self.update_batch(np.array([t]), np.array([y]))
+
+    def update_batch(self, times: np.ndarray, values: np.ndarray) -> np.ndarray:
+        """
+        Adds a batch of observations.
+
+        Args:
+            times (np.ndarray): times of the observations
+            values (np.ndarray): values of the observations
+
+        Returns:
+            np.ndarray: the SMA values that became available (time, sma)
+        """
+        times = np.asarray(times, dtype=float)
+        values = np.asarray(values, dtype=float)
+        if len(times) == 0:
+            return np.empty((0, 2))
+
+        first = self._end == 0
+        self._append(times, values)
+        rv = []
+        if first:
+            # the first SMA is the first observation (as in the batch functions)
+            rv.append(np.array([[times[0], values[0]]]))
+            self._next = 1
+
+        pending_times = self._times[self._next : self._end]
+        ready = np.count_nonzero(
+            pending_times + self.width_after < self._times[self._end - 1]
+        )
+        rv.append(self._emit(ready))
+        return np.concatenate(rv)
+
+    def flush(self) -> np.ndarray:
+        """
+        Emits the pending values, assuming the stream has ended.
+
+        Returns:
+            np.ndarray: the remaining SMA values (time, sma)
+        """
+        return self._emit(self.pending)
+
+    def _append(self, times: np.ndarray, values: np.ndarray):
+        k = len(times)
+        size = self._end - self._start
+        if self._end + k > len(self._times):
+            capacity = len(self._times)
+            while size + k > capacity // 2:
+                capacity *= 2
+            self._compact(capacity)
+
+        s, e = self._start, self._end
+        if e > s:
+            area = _prefix_area(
+                np.concatenate(([self._times[e - 1]], times)),
+                np.concatenate(([self._y[e - 1]], values)),
+                self.scheme,
+            )
+            area = area[1:] + self._area[e - 1]
+        else:
+            area = _prefix_area(times, values, self.scheme)
+
+        self._times[e : e + k] = times
+        self._y[e : e + k] = values
+        self._area[e : e + k] = area
+        self._end = e + k
+
+    def _compact(self, capacity: int):
+        s, e = self._start, self._end
+        times, y, area = np.empty(capacity), np.empty(capacity), np.empty(capacity)
+        times[: e - s] = self._times[s:e]
+        y[: e - s] = self._y[s:e]
+        # rebase the cumulative area to keep its magnitude bounded
+        area[: e - s] = self._area[s:e] - self._area[s]
+        self._times, self._y, self._area = times, y, area
+        self._start, self._end, self._next = 0, e - s, self._next - s
+
+    def _emit(self, k: int) -> np.ndarray:
+        if k == 0:
+            return np.empty((0, 2))
+
+        s, e = self._start, self._end
+        low, high = self._next, self._next + k
+        t = self._times[low:high]
+        roll_area = _window_area(
+            self._times[s:e],
+            self._y[s:e],
+            self._area[s:e],
+            t - self.width_before,
+            t + self.width_after,
+            self.scheme,
+        )
+        self._next = high
+
+        # keep the observation before the left edge of the next window
+        t_next = self._times[self._next] if self._next < e else self._times[e - 1]
+        left = np.searchsorted(
+            self._times[s:e], t_next - self.width_before, side="left"
+        )
+        self._start = s + max(int(left) - 1, 0)
+
+        return np.column_stack((t, roll_area / (self.width_before + self.width_after)))
@@ -49,6 +49,81 @@ class TestEMA(unittest.TestCase):
         self.assertEqual(ema.next(single, 1)[0, 1], 10.0)
         self.assertEqual(ema.linear(single, 1)[0, 1], 10.0)
 
+    def test_vectorized_matches_reference(self):
+        rng = np.random.default_rng(42)
+        t = np.cumsum(rng.exponential(1.0, 1000))
+        # tiny steps exercise the Taylor branch of the linear scheme
+        t[100:110] = t[100] + np.arange(10) * 1e-8
+        t[500:503] = t[500]
+        values = np.column_stack((t, rng.normal(size=1000)))
+        npt.assert_allclose(ema.last(values, 2.0), ema._last_reference(values, 2.0))
+        npt.assert_allclose(ema.next(values, 2.0), ema._next_reference(values, 2.0))
+        npt.assert_allclose(ema.linear(values, 2.0), ema._linear_reference(values, 2.0))
+
+    def test_state_matches_batch(self):
+        rng = np.random.default_rng(7)
+        t = np.cumsum(rng.exponential(1.0, 200))
+        values = np.column_stack((t, rng.normal(size=200)))
+        for scheme in ("last", "next", "linear"):
+            desired = getattr(ema, scheme)(values, 1.5)
+            state = ema.EMAState(1.5, scheme)
+            first = [state.update(t[i], values[i, 1]) for i in range(10)]
+            npt.assert_allclose(first, desired[:10, 1])
+            # checkpoint and resume in a new object
+            state = ema.EMAState.from_dict(state.to_dict())
+            npt.assert_allclose(
+                state.update_batch(t[10:50], values[10:50, 1]), desired[10:50]
+            )
+            npt.assert_allclose(
+                state.update_batch(t[50:], values[50:, 1]), desired[50:]
+            )
+
+    def test_bank(self):
+        values = np.array(
+            [[0.0, 0.0], [1.0, 2.0], [1.2, 4.0], [2.3, 6], [2.9, 8], [5, 10]]
+        )
+        taus = [0.5, 1.5, 4.0]
+        for scheme in ("last", "next", "linear"):
+            result = ema.bank(values, taus, scheme)
+            self.assertEqual(result.shape, (6, 3))
+            for k, tau in enumerate(taus):
+                desired = getattr(ema, scheme)(values, tau)[:, 1]
+                npt.assert_allclose(result[:, k], desired)
+
+    def test_sample(self):
+        values = np.array(
+            [[0.0, 0.0], [1.0, 2.0], [1.2, 4.0], [2.3, 6], [2.9, 8], [5, 10]]
+        )
+        for scheme in ("last", "next", "linear"):
+            result = ema.sample(values, [-1.0, 1.0, 1.7, 6.0], 1.5, scheme)
+            self.assertTrue(np.isnan(result[0, 1]))
+            # a query at an observation returns the batch EMA
+            desired = getattr(ema, scheme)(values, 1.5)
+            self.assertAlmostEqual(result[1, 1], desired[1, 1])
+            # a query between observations matches inserting the interpolated point
+            y = {"last": 4.0, "next": 6.0, "linear": 4.0 + 2.0 * 0.5 / 1.1}[scheme]
+            merged = np.insert(values, 3, [1.7, y], axis=0)
+            desired = getattr(ema, scheme)(merged, 1.5)
+            self.assertAlmostEqual(result[2, 1], desired[3, 1])
+
+    def test_batch(self):
+        rng = np.random.default_rng(3)
+        sizes = [5, 0, 1, 300, 17]
+        series = [
+            np.column_stack((np.cumsum(rng.exponential(1.0, k)), rng.normal(size=k)))
+            for k in sizes
+        ]
+        values = np.concatenate(series)
+        offsets = np.concatenate(([0], np.cumsum(sizes)))
+        for scheme in ("last", "next", "linear"):
+            result = ema.batch(values, offsets, 2.0, scheme)
+            desired = np.concatenate(
+                [getattr(ema, scheme)(s, 2.0) for s in series if len(s)]
+            )
+            npt.assert_allclose(result, desired)
+        with self.assertRaises(ValueError):
+            ema.batch(values, [0, 10], 2.0)
+
 
 if __name__ == "__main__":
     unittest.main()
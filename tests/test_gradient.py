@@ -64,6 +64,143 @@ class TestGradient(unittest.TestCase):
         desired = np.array([-0.5, 0.0, 0.5])
         npt.assert_almost_equal(weights, desired)
 
+    def test_finite_difference_weights_batch(self):
+        rng = np.random.default_rng(11)
+        x = np.cumsum(rng.uniform(0.1, 1.0, (20, 5)), axis=1)
+        x0 = x[:, 2] + rng.uniform(-0.05, 0.05, 20)
+        for m in range(4):
+            result = gradient.finite_difference_weights_batch(x0, x, m)
+            desired = [
+                gradient._finite_difference_weights_reference(a, b, m)
+                for a, b in zip(x0, x)
+            ]
+            npt.assert_allclose(result, desired, rtol=1e-9, atol=1e-12)
+        with self.assertRaises(ValueError):
+            gradient.finite_difference_weights_batch(x0[:3], x, 1)
+
+    def test_fd_derivative_uneven(self):
+        rng = np.random.default_rng(12)
+        x = np.cumsum(rng.uniform(0.1, 1.0, 50))
+        y = np.sin(x)
+        result = gradient.fd_derivative(x, y, m=1, stencil_size=5)
+        desired = []
+        for i in range(50):
+            start = max(0, min(i - 2, 45))
+            weights = gradient._finite_difference_weights_reference(
+                x[i], x[start : start + 5], 1
+            )
+            desired.append(np.dot(weights, y[start : start + 5]))
+        npt.assert_allclose(result, desired, rtol=1e-9, atol=1e-12)
+
+    def test_fd_derivative_all_orders(self):
+        rng = np.random.default_rng(13)
+        x = np.cumsum(rng.uniform(0.1, 0.3, 40))
+        y = np.sin(x)
+        result = gradient.fd_derivative(x, y, m=2, stencil_size=5, all_orders=True)
+        self.assertEqual(result.shape, (40, 3))
+        for k in range(3):
+            desired = gradient.fd_derivative(x, y, m=k, stencil_size=5)
+            npt.assert_allclose(result[:, k], desired, rtol=1e-9, atol=1e-12)
+        npt.assert_allclose(result[:, 0], y, atol=1e-12)
+
+    def test_stencil_cache(self):
+        x = np.arange(30.0) * 0.5
+        x[10] += 0.01
+        y = np.cos(x)
+        cache = gradient.StencilCache(maxsize=4)
+        result = gradient.fd_derivative(x, y, m=1, stencil_size=5, cache=cache)
+        desired = gradient.fd_derivative(x, y, m=1, stencil_size=5)
+        npt.assert_allclose(result, desired, rtol=1e-9, atol=1e-12)
+        self.assertEqual(cache.hits + cache.misses, 30)
+        self.assertLessEqual(len(cache), 4)
+        cache = gradient.StencilCache()
+        gradient.fd_derivative(x, y, m=1, stencil_size=5, cache=cache)
+        misses = cache.misses
+        gradient.fd_derivative(x[:8], y[:8], m=1, stencil_size=5, cache=cache)
+        self.assertEqual(cache.misses, misses)
+        result = gradient.fd_derivative(
+            x, y, m=2, stencil_size=5, all_orders=True, cache=cache
+        )
+        desired = gradient.fd_derivative(x, y, m=2, stencil_size=5, all_orders=True)
+        npt.assert_allclose(result, desired, rtol=1e-9, atol=1e-12)
+
+    def test_multi_channel(self):
+        rng = np.random.default_rng(14)
+        x = np.cumsum(rng.uniform(0.1, 1.0, 30))
+        y = rng.normal(size=(30, 4))
+        for func in (gradient.cfd, gradient.csd):
+            result = func(x, y)
+            self.assertEqual(result.shape, (30, 4))
+            for c in range(4):
+                npt.assert_allclose(result[:, c], func(x, y[:, c]))
+        result = gradient.fd_derivative(x, y, m=1, stencil_size=5)
+        for c in range(4):
+            desired = gradient.fd_derivative(x, y[:, c], m=1, stencil_size=5)
+            npt.assert_allclose(result[:, c], desired)
+        result = gradient.fd_derivative(x, y, m=2, stencil_size=5, all_orders=True)
+        self.assertEqual(result.shape, (30, 4, 3))
+        desired = gradient.fd_derivative(
+            x, y[:, 2], m=2, stencil_size=5, all_orders=True
+        )
+        npt.assert_allclose(result[:, 2], desired)
+
+    def test_savgol_derivative(self):
+        rng = np.random.default_rng(15)
+        x = 1000.0 + np.cumsum(rng.uniform(0.5, 1.5, 60))
+        u = x - 1030.0
+        y = 2.0 + u - 0.5 * u**2 + 0.1 * u**3
+        desired = np.column_stack((y, 1.0 - u + 0.3 * u**2, -1.0 + 0.6 * u))
+        result = gradient.savgol_derivative(x, y, m=2, degree=3, width=4.0)
+        npt.assert_allclose(result, desired, rtol=1e-6, atol=1e-6)
+        result = gradient.savgol_derivative(x, y, m=2, degree=3, window_size=7)
+        npt.assert_allclose(result, desired, rtol=1e-6, atol=1e-6)
+
+        noisy = np.sin(x / 5.0) + rng.normal(scale=0.01, size=60)
+        result = gradient.savgol_derivative(x, noisy, m=1, degree=2, window_size=9)
+        desired = []
+        for i in range(60):
+            start = max(0, min(i - 4, 51))
+            a = np.polyfit(x[start : start + 9] - x[i], noisy[start : start + 9], 2)
+            desired.append([a[2], a[1]])
+        npt.assert_allclose(result, desired, rtol=1e-6, atol=1e-9)
+
+        channels = np.column_stack((noisy, -noisy))
+        result = gradient.savgol_derivative(x, channels, m=1, window_size=9)
+        self.assertEqual(result.shape, (60, 2, 2))
+        npt.assert_allclose(result[:, 1], -result[:, 0])
+
+        sparse = gradient.savgol_derivative(x, y, m=1, degree=2, width=0.4)
+        self.assertTrue(np.all(np.isnan(sparse)))
+        with self.assertRaises(ValueError):
+            gradient.savgol_derivative(x, y, m=3, degree=2, width=4.0)
+        with self.assertRaises(ValueError):
+            gradient.savgol_derivative(x, y, width=4.0, window_size=5)
+
+    def test_savgol_derivative_gaps(self):
+        # three bursts of close points separated by large gaps
+        x = np.concatenate([np.arange(50) * 1e-3 + o for o in (0.0, 1e4, 2e4)])
+        y = np.sin(50.0 * x)
+        result = gradient.savgol_derivative(x, y, m=2, degree=2, window_size=5)
+        # the windows that cross a gap included
+        for i in range(150):
+            start = max(0, min(i - 2, 145))
+            a = np.polyfit(x[start : start + 5] - x[i], y[start : start + 5], 2)
+            npt.assert_allclose(result[i], [a[2], a[1], 2 * a[0]], rtol=1e-6, atol=1e-6)
+        result = gradient.savgol_derivative(x, y, m=2, degree=2, width=2e-3)
+        npt.assert_allclose(result[25::50, 2], -2500.0 * y[25::50], rtol=1e-3)
+
+        # numerically singular normal equations: one point across a gap
+        x = np.array([49.773693029589, 1053.143431616314, 1053.6964203248651])
+        x = np.concatenate(
+            (x, [1058.7542032772014, 1059.124425491709, 1059.5859269876826])
+        )
+        y = np.cos(x / 5.0)
+        result = gradient.savgol_derivative(x, y, m=4, degree=4, window_size=6)
+        for i in range(6):
+            a = np.polynomial.polynomial.polyfit(x - x[i], y, 4)
+            desired = a * [1.0, 1.0, 2.0, 6.0, 24.0]
+            npt.assert_allclose(result[i], desired, rtol=1e-6)
+
 
 if __name__ == "__main__":
     unittest.main()
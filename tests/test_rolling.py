@@ -33,6 +33,23 @@ class Test_Rolling(unittest.TestCase):
         )
         npt.assert_almost_equal(result, desired, decimal=2)
 
+    def test_stable_with_large_offset(self):
+        rng = np.random.default_rng(42)
+        t = np.cumsum(rng.exponential(1.0, 20000))
+        y = 1e6 + rng.normal(size=20000) * 1e-2
+        values = np.column_stack((t, y))
+        left, right = rolling._get_window_indices(t, 20.0, 0.0)
+        idx = np.arange(100, 20000, 997)
+        desired_sum = [np.sum(y[left[i] : right[i]]) for i in idx]
+        desired_var = [np.var(y[left[i] : right[i]], ddof=1) for i in idx]
+
+        result = rolling.sum_stable(values, 20.0, 0.0)
+        npt.assert_allclose(result[idx, 1], desired_sum, rtol=1e-14)
+        result = rolling.var_stable(values, 20.0, 0.0)
+        npt.assert_allclose(result[idx, 1], desired_var, rtol=1e-8)
+        result = rolling.std_stable(values, 20.0, 0.0)
+        npt.assert_allclose(result[idx, 1], np.sqrt(desired_var), rtol=1e-8)
+
     def test_product(self):
         result = rolling.product(self.values, 2.5, 1.0, eps=1e-10)
         desired = np.array(
@@ -62,6 +79,63 @@ class Test_Rolling(unittest.TestCase):
         result = rolling.apply(self.values, 2.5, 1.0, np.median)
         self.assertEqual(result[3, 1], 4.0)
 
+    def test_rolling_median(self):
+        result = rolling.median(self.values, 2.5, 1.0)
+        npt.assert_almost_equal(result[:, 1], [1.0, 2.0, 2.0, 4.0, 5.0, 9.0])
+
+    def test_rolling_quantile(self):
+        rng = np.random.default_rng(42)
+        t = np.sort(np.round(rng.uniform(0.0, 200.0, 2000)))
+        y = np.round(rng.normal(size=2000), 1)
+        values = np.column_stack((t, y))
+        q = [0.0, 0.1, 0.5, 0.95, 1.0]
+        left, right = rolling._get_window_indices(t, 5.5, 2.0)
+        desired = [np.quantile(y[low:high], q) for low, high in zip(left, right)]
+        result = rolling.quantile(values, 5.5, 2.0, q)
+        self.assertEqual(result.shape, (2000, 6))
+        npt.assert_allclose(result[:, 1:], desired)
+        result = rolling.quantile(values, 5.5, 2.0, 0.25)
+        self.assertEqual(result.shape, (2000, 2))
+        with self.assertRaises(ValueError):
+            rolling.quantile(values, 5.5, 2.0, 1.5)
+
+    def test_rolling_quantile_sketch(self):
+        rng = np.random.default_rng(42)
+        t = np.cumsum(rng.exponential(1.0, 20000))
+        y = rng.normal(size=20000)
+        values = np.column_stack((t, y))
+        q = [0.0, 0.1, 0.5, 0.9, 1.0]
+        eps = 0.02
+        result = rolling.quantile(values, 5000.0, 0.0, q, eps=eps)
+        left, right = rolling._get_window_indices(t, 5000.0, 0.0)
+        for i in range(0, 20000, 499):
+            window = np.sort(y[left[i] : right[i]])
+            for j, quant in enumerate(q):
+                # the rank of the result is within eps * N of the exact rank
+                low = np.searchsorted(window, result[i, j + 1], side="left")
+                high = np.searchsorted(window, result[i, j + 1], side="right")
+                target = quant * len(window)
+                self.assertGreaterEqual(target, low - eps * len(window))
+                self.assertLessEqual(target, high + eps * len(window))
+        result = rolling.median(self.values, 2.5, 1.0, eps=0.1)
+        npt.assert_almost_equal(result[:, 1], [1.0, 2.0, 2.0, 4.0, 5.0, 9.0])
+
+        # small eps: the blocks are capped, the leaves span several blocks
+        y = np.cumsum(rng.normal(size=60000))
+        values = np.column_stack((np.arange(60000.0), y))
+        at_times = np.linspace(40000.0, 59999.0, 7)
+        eps = 1e-4
+        result = rolling.quantile(values, 40000.0, 0.0, q, at_times=at_times, eps=eps)
+        left, right = rolling._get_window_indices(values[:, 0], 40000.0, 0.0, at_times)
+        for i in range(7):
+            window = np.sort(y[left[i] : right[i]])
+            for j, quant in enumerate(q):
+                low = np.searchsorted(window, result[i, j + 1], side="left")
+                high = np.searchsorted(window, result[i, j + 1], side="right")
+                target = quant * len(window)
+                self.assertGreaterEqual(target, low - eps * len(window))
+                self.assertLessEqual(target, high + eps * len(window))
+
     def test_empty_input(self):
         empty = np.array([]).reshape(0, 2)
         self.assertEqual(len(rolling.sum(empty, 1, 1)), 0)
@@ -72,6 +146,10 @@ class Test_Rolling(unittest.TestCase):
         self.assertEqual(len(rolling.min(empty, 1, 1)), 0)
         self.assertEqual(len(rolling.apply(empty, 1, 1, np.mean)), 0)
         self.assertEqual(len(rolling.product(empty, 1, 1)), 0)
+        self.assertEqual(len(rolling.var_stable(empty, 1, 1)), 0)
+        self.assertEqual(len(rolling.median(empty, 1, 1)), 0)
+        self.assertEqual(len(rolling.skew(empty, 1, 1)), 0)
+        self.assertEqual(len(rolling.corr(np.array([]).reshape(0, 3), 1, 1)), 0)
 
     def test_single_point(self):
         single = np.array([[1.0, 10.0]])
@@ -84,6 +162,220 @@ class Test_Rolling(unittest.TestCase):
         self.assertEqual(rolling.min(single, 1, 1)[0, 1], 10.0)
         self.assertEqual(rolling.apply(single, 1, 1, np.mean)[0, 1], 10.0)
         self.assertEqual(rolling.product(single, 1, 1)[0, 1], 10.0)
+        self.assertEqual(rolling.median(single, 1, 1)[0, 1], 10.0)
+
+    def test_rolling_max_min_random(self):
+        rng = np.random.default_rng(42)
+        t = np.sort(np.round(rng.uniform(0.0, 100.0, 500)))
+        y = np.round(rng.normal(size=500), 1)
+        values = np.column_stack((t, y))
+        left, right = rolling._get_window_indices(t, 3.5, 1.0)
+        desired_max = [np.max(y[low:high]) for low, high in zip(left, right)]
+        desired_min = [np.min(y[low:high]) for low, high in zip(left, right)]
+        npt.assert_equal(rolling.max(values, 3.5, 1.0)[:, 1], desired_max)
+        npt.assert_equal(rolling.min(values, 3.5, 1.0)[:, 1], desired_min)
+
+    def test_product_signs_and_log(self):
+        values = np.array(
+            [[0.0, -2.0], [1.0, 1e-12], [2.0, -3.0], [3.0, 0.5], [4.0, 4.0]]
+        )
+        result = rolling.product(values, 1.5, 0.0)
+        npt.assert_allclose(result[:, 1], [-2.0, -2e-12, -3e-12, -1.5, 2.0])
+        result = rolling.product(values, 1.5, 0.0, eps=1e-9)
+        npt.assert_allclose(result[:, 1], [-2.0, 0.0, 0.0, -1.5, 2.0])
+        result = rolling.product(values, 1.5, 0.0, eps=1e-9, log=True)
+        npt.assert_allclose(
+            result[:, 1], [np.log(2.0), -np.inf, -np.inf, np.log(1.5), np.log(2.0)]
+        )
+        large = np.column_stack((np.arange(100.0), np.full(100, 1e10)))
+        result = rolling.product(large, 50.0, 0.0, log=True)
+        self.assertAlmostEqual(result[-1, 1], 50 * np.log(1e10))
+
+    def test_rolling_window(self):
+        rng = np.random.default_rng(7)
+        t = np.sort(rng.uniform(0.0, 50.0, 200))
+        values = np.column_stack((t, rng.normal(size=200)))
+        window = rolling.RollingWindow(values, 2.0, 1.0)
+        for name in ("num_obs", "sum", "mean", "var", "std", "max", "min", "median"):
+            desired = getattr(rolling, name)(values, 2.0, 1.0)
+            npt.assert_allclose(getattr(window, name)(), desired)
+        npt.assert_allclose(
+            window.quantile([0.1, 0.9]), rolling.quantile(values, 2.0, 1.0, [0.1, 0.9])
+        )
+        self.assertEqual(rolling.RollingWindow(np.array([]), 1.0, 1.0).mean().size, 0)
+
+    def test_rolling_moments(self):
+        rng = np.random.default_rng(3)
+        t = np.sort(rng.uniform(0.0, 50.0, 300))
+        a = 1000.0 + rng.normal(size=300)
+        b = 0.5 * a + rng.normal(size=300)
+        values = np.column_stack((t, a, b))
+        left, right = rolling._get_window_indices(t, 3.0, 1.0)
+        skew, kurt, cov, corr = [], [], [], []
+        for low, high in zip(left, right):
+            x, z, n = a[low:high], b[low:high], high - low
+            d = x - np.mean(x)
+            m2, m3, m4 = np.mean(d**2), np.mean(d**3), np.mean(d**4)
+            g1, g2 = m3 / m2**1.5, m4 / m2**2 - 3.0
+            skew.append(np.sqrt(n * (n - 1)) / (n - 2) * g1 if n >= 3 else np.nan)
+            kurt.append(
+                (n - 1) / ((n - 2) * (n - 3)) * ((n + 1) * g2 + 6) if n >= 4 else np.nan
+            )
+            cov.append(np.cov(x, z)[0, 1] if n > 1 else np.nan)
+            corr.append(np.corrcoef(x, z)[0, 1] if n > 1 else np.nan)
+        npt.assert_allclose(rolling.skew(values, 3.0, 1.0)[:, 1], skew, rtol=1e-6)
+        npt.assert_allclose(rolling.kurt(values, 3.0, 1.0)[:, 1], kurt, rtol=1e-6)
+        npt.assert_allclose(rolling.cov(values, 3.0, 1.0)[:, 1], cov, rtol=1e-6)
+        npt.assert_allclose(rolling.corr(values, 3.0, 1.0)[:, 1], corr, rtol=1e-6)
+        flat = np.column_stack((t[:10], np.ones(10), np.ones(10)))
+        self.assertTrue(np.all(np.isnan(rolling.skew(flat, 5.0, 5.0)[:, 1])))
+        self.assertTrue(np.all(np.isnan(rolling.corr(flat, 5.0, 5.0)[:, 1])))
+        with self.assertRaises(ValueError):
+            rolling.cov(values[:, :2], 3.0, 1.0)
+
+    def test_at_times(self):
+        rng = np.random.default_rng(5)
+        t = np.sort(rng.uniform(0.0, 100.0, 400))
+        values = np.column_stack((t, rng.normal(size=400)))
+        at_times = np.array([-5.0, 10.0, 33.3, 50.0, 99.0, 120.0])
+        left, right = rolling._get_window_indices(t, 4.0, 2.0, at_times)
+        y = values[:, 1]
+        for name, func in (("mean", np.mean), ("max", np.max), ("median", np.median)):
+            result = getattr(rolling, name)(values, 4.0, 2.0, at_times=at_times)
+            desired = [func(y[l:r]) if r > l else np.nan for l, r in zip(left, right)]
+            npt.assert_equal(result[:, 0], at_times)
+            npt.assert_allclose(result[:, 1], desired)
+        result = rolling.num_obs(values, 4.0, 2.0, at_times=at_times)
+        npt.assert_equal(result[:, 1], right - left)
+        self.assertEqual(result[0, 1], 0.0)
+        with self.assertRaises(ValueError):
+            rolling.mean(values, 4.0, 2.0, at_times=at_times[::-1])
+
+    def test_min_max_obs(self):
+        t = np.array([0.0, 1.0, 2.0, 2.1, 2.2, 2.3, 2.4, 10.0])
+        values = np.column_stack((t, np.arange(8.0)))
+        result = rolling.num_obs(values, 1.0, 0.0, max_obs=3)
+        npt.assert_equal(result[:, 1], [1, 1, 1, 2, 3, 3, 3, 1])
+        result = rolling.num_obs(values, 1.0, 0.0, min_obs=3)
+        npt.assert_equal(result[:, 1], [1, 2, 3, 3, 3, 4, 5, 3])
+        result = rolling.max(values, 1.0, 0.0, min_obs=2, max_obs=2)
+        npt.assert_equal(result[:, 1], [0, 1, 2, 3, 4, 5, 6, 7])
+        result = rolling.min(values, 1.0, 0.0, min_obs=2, max_obs=2)
+        npt.assert_equal(result[:, 1], [0, 0, 1, 2, 3, 4, 5, 6])
+        with self.assertRaises(ValueError):
+            rolling.mean(values, 1.0, 0.0, min_obs=4, max_obs=2)
+
+    def test_rolling_argmax_argmin(self):
+        values = np.array(
+            [[0.0, 1.0], [1.0, 3.0], [2.0, 3.0], [3.0, -1.0], [10.0, 2.0]]
+        )
+        result = rolling.argmax(values, 2.0, 0.0)
+        npt.assert_equal(result[:, 1], [1.0, 3.0, 3.0, 3.0, 2.0])
+        npt.assert_equal(result[:, 2], [0, 1, 1, 2, 4])
+        npt.assert_equal(result[:, 3], [0.0, 1.0, 1.0, 2.0, 10.0])
+        result = rolling.argmin(values, 2.0, 0.0, at_times=[-5.0, 3.0])
+        npt.assert_equal(result[0, 1:], [np.nan, np.nan, np.nan])
+        npt.assert_equal(result[1, 1:], [-1.0, 3, 3.0])
+        values[2, 1] = np.nan
+        result = rolling.argmax(values, 2.0, 0.0)
+        npt.assert_equal(result[2:4, 1:], np.full((2, 3), np.nan))
+        npt.assert_equal(result[4, 1:], [2.0, 4, 10.0])
+
+    def test_product_long_window(self):
+        t = np.arange(3000.0)
+        result = rolling.product(
+            np.column_stack((t, np.full(3000, 1.0001))), 3000.0, 0.0
+        )
+        npt.assert_allclose(result[:, 1], 1.0001 ** (t + 1), rtol=1e-9)
+        # the product overflows after ~1750 values, as np.prod does
+        with np.errstate(over="ignore"):
+            result = rolling.product(
+                np.column_stack((t, np.full(3000, 1.5))), 3000.0, 0.0
+            )
+        npt.assert_allclose(result[:1100, 1], 1.5 ** (t[:1100] + 1), rtol=1e-9)
+        self.assertEqual(result[2000, 1], np.inf)
+
+    def test_product_nan(self):
+        values = np.array(
+            [[0, 2], [1, np.nan], [2, 3], [3, 4], [4, 5], [5, 6]], dtype=float
+        )
+        with np.errstate(all="raise"):
+            result = rolling.product(values, 0.5, 0.5)
+            npt.assert_allclose(result[:, 1], [2.0, np.nan, 3.0, 4.0, 5.0, 6.0])
+            result = rolling.product(values, 1.5, 0.0, log=True)
+        npt.assert_allclose(
+            result[:, 1],
+            [np.log(2.0), np.nan, np.nan] + list(np.log([12.0, 20.0, 30.0])),
+        )
+
+    def test_rolling_max_min_nan(self):
+        values = np.array(
+            [[0.0, 1.0], [1.0, np.nan], [2.0, 3.0], [3.0, 0.5], [4.0, 2.0]]
+        )
+        result = rolling.max(values, 2.5, 0.0)
+        npt.assert_equal(result[:, 1], [1.0, np.nan, np.nan, np.nan, 3.0])
+        result = rolling.min(values, 1.5, 0.0)
+        npt.assert_equal(result[:, 1], [1.0, np.nan, np.nan, 0.5, 0.5])
+
+    def test_rolling_median_nan(self):
+        values = np.array(
+            [[0.0, 1.0], [1.0, np.nan], [2.0, 3.0], [3.0, 0.5], [4.0, 2.0]]
+        )
+        result = rolling.median(values, 2.5, 0.0)
+        npt.assert_equal(result[:, 1], [1.0, np.nan, np.nan, np.nan, 2.0])
+        result = rolling.median(values, 2.5, 0.0, eps=0.1)
+        npt.assert_equal(result[:, 1], [1.0, np.nan, np.nan, np.nan, 2.0])
+        result = rolling.quantile(values, 1.5, 0.0, [0.0, 1.0])
+        npt.assert_equal(result[3:, 1:], [[0.5, 3.0], [0.5, 2.0]])
+
+    def test_at_times_sparse(self):
+        rng = np.random.default_rng(6)
+        t = np.sort(rng.uniform(0.0, 1000.0, 2000))
+        values = np.column_stack((t, rng.normal(size=2000)))
+        at_times = np.sort(rng.uniform(0.0, 1000.0, 40))
+        left, right = rolling._get_window_indices(t, 15.0, 5.0, at_times)
+        y = values[:, 1]
+        for name, func in (("min", np.min), ("median", np.median)):
+            result = getattr(rolling, name)(values, 15.0, 5.0, at_times=at_times)
+            desired = [func(y[l:r]) if r > l else np.nan for l, r in zip(left, right)]
+            npt.assert_allclose(result[:, 1], desired)
+
+    def test_rolling_moments_with_drift(self):
+        rng = np.random.default_rng(8)
+        t = np.arange(20000.0)
+        a = 0.1 * t + rng.normal(size=20000)
+        b = -0.3 * t + a + rng.normal(size=20000)
+        values = np.column_stack((t, a, b))
+        skew = rolling.skew(values, 49.5, 0.0)[:, 1]
+        kurt = rolling.kurt(values, 49.5, 0.0)[:, 1]
+        corr = rolling.corr(values, 49.5, 0.0)[:, 1]
+        for i in range(49, 20000, 1999):
+            x, z, n = a[i - 49 : i + 1], b[i - 49 : i + 1], 50
+            d = x - np.mean(x)
+            m2, m3, m4 = np.mean(d**2), np.mean(d**3), np.mean(d**4)
+            g1, g2 = m3 / m2**1.5, m4 / m2**2 - 3.0
+            self.assertAlmostEqual(skew[i], np.sqrt(n * (n - 1)) / (n - 2) * g1)
+            desired = (n - 1) / ((n - 2) * (n - 3)) * ((n + 1) * g2 + 6)
+            self.assertAlmostEqual(kurt[i], desired)
+            self.assertAlmostEqual(corr[i], np.corrcoef(x, z)[0, 1])
+
+        # windows stretched by min_obs, still grouped over a few windows of rows
+        window = rolling.RollingWindow(values, 0.5, 0.0, min_obs=500)
+        rows, _, _ = window._groups
+        self.assertLess(len(rows), 10 * len(t))
+        skew = window.skew()[:, 1]
+        for i in (2, 499, 7000, 19999):
+            x = a[max(0, i - 499) : i + 1]
+            n = len(x)
+            d = x - np.mean(x)
+            g1 = np.mean(d**3) / np.mean(d**2) ** 1.5
+            self.assertAlmostEqual(skew[i], np.sqrt(n * (n - 1)) / (n - 2) * g1)
+
+        # empty windows are NaN without warnings
+        with np.errstate(all="raise"):
+            for name in ("skew", "kurt"):
+                result = getattr(rolling, name)(values, 1.0, 0.0, at_times=[-5.0])
+                npt.assert_array_equal(result, [[-5.0, np.nan]])
 
 
 if __name__ == "__main__":
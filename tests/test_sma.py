@@ -49,6 +49,89 @@ class TestSMA(unittest.TestCase):
         self.assertEqual(sma.next(single, 1, 1)[0, 1], 10.0)
         self.assertEqual(sma.linear(single, 1, 1)[0, 1], 10.0)
 
+    def test_vectorized_matches_reference(self):
+        rng = np.random.default_rng(42)
+        # rounded times produce duplicated observations
+        t = np.sort(np.round(rng.uniform(0.0, 50.0, 500), 1))
+        values = np.column_stack((t, rng.normal(size=500)))
+        for width_before, width_after in ((2.5, 1.0), (0.0, 3.0), (4.0, 0.0)):
+            npt.assert_allclose(
+                sma.last(values, width_before, width_after),
+                sma._last_reference(values, width_before, width_after),
+            )
+            npt.assert_allclose(
+                sma.next(values, width_before, width_after),
+                sma._next_reference(values, width_before, width_after),
+            )
+            npt.assert_allclose(
+                sma.linear(values, width_before, width_after),
+                sma._linear_reference(values, width_before, width_after),
+            )
+
+    def test_state_matches_batch(self):
+        rng = np.random.default_rng(7)
+        t = np.sort(np.round(rng.uniform(0.0, 500.0, 2000), 1))
+        values = np.column_stack((t, rng.normal(size=2000)))
+        for scheme in ("last", "next", "linear"):
+            state = sma.SMAState(2.5, 1.0, scheme, capacity=16)
+            result = [state.update(t[i], values[i, 1]) for i in range(10)]
+            self.assertGreater(state.pending, 0)
+            self.assertLessEqual(state.latency, 1.0)
+            for i in range(10, 2000, 50):
+                result.append(state.update_batch(t[i : i + 50], values[i : i + 50, 1]))
+            result.append(state.flush())
+            self.assertEqual(state.pending, 0)
+            desired = getattr(sma, scheme)(values, 2.5, 1.0)
+            npt.assert_allclose(np.concatenate(result), desired)
+            # only the observations of the last windows are kept
+            self.assertLessEqual(len(state._times), 256)
+
+    def test_bank(self):
+        values = np.array(
+            [[0.0, 0.0], [1.0, 2.0], [1.2, 4.0], [2.3, 6], [2.9, 8], [5, 10]]
+        )
+        windows = [(2.5, 1.0), (1.0, 0.0), (0.5, 3.0)]
+        for scheme in ("last", "next", "linear"):
+            result = sma.bank(values, windows, scheme)
+            self.assertEqual(result.shape, (6, 3))
+            for k, (width_before, width_after) in enumerate(windows):
+                desired = getattr(sma, scheme)(values, width_before, width_after)
+                npt.assert_allclose(result[:, k], desired[:, 1])
+
+    def test_sample(self):
+        values = np.array(
+            [[0.0, 0.0], [1.0, 2.0], [1.2, 4.0], [2.3, 6], [2.9, 8], [5, 10]]
+        )
+        for scheme in ("last", "next", "linear"):
+            # at the input times (except the first) sample matches the SMA
+            result = sma.sample(values, values[1:, 0], 2.5, 1.0, scheme)
+            desired = getattr(sma, scheme)(values, 2.5, 1.0)
+            npt.assert_allclose(result, desired[1:])
+            # windows outside the observations hold the first and last values
+            result = sma.sample(values, [-10.0, 20.0], 2.5, 1.0, scheme)
+            npt.assert_allclose(result[:, 1], [0.0, 10.0])
+
+        result = sma.sample(values, [1.5], 0.2, 0.2, "last")
+        npt.assert_allclose(result[0, 1], 4.0)
+
+    def test_var_std(self):
+        values = np.array(
+            [[0.0, 0.0], [1.0, 2.0], [1.2, 4.0], [2.3, 6], [2.9, 8], [5, 10]]
+        )
+        # window for t=2.3 is [-0.2, 3.3]: 0 (1.2), 2 (0.2), 4 (1.1), 6 (0.6), 8 (0.4)
+        result = sma.var(values, 2.5, 1.0, "last")
+        self.assertAlmostEqual(result[3, 1], 65.6 / 3.5 - (11.6 / 3.5) ** 2)
+        result = sma.std(values, 2.5, 1.0, "last")
+        self.assertAlmostEqual(result[3, 1], np.sqrt(65.6 / 3.5 - (11.6 / 3.5) ** 2))
+
+        # linear interpolation of a line: variance of a uniform ramp
+        ramp = np.array([[0.0, 0.0], [1.0, 1.0], [3.0, 3.0], [4.0, 4.0]])
+        result = sma.var(ramp, 1.0, 1.0, "linear")
+        npt.assert_allclose(result[1:3, 1], [4.0 / 12.0, 4.0 / 12.0])
+
+        empty = np.array([]).reshape(0, 2)
+        self.assertEqual(len(sma.std(empty, 1, 1)), 0)
+
 
 if __name__ == "__main__":
     unittest.main()